@@ -0,0 +1,63 @@
+import numpy
+
+#multi resolution scan result for coarse to fine scanning: the scan grid is covered by square cells
+#(size in pixels of the grid, halved on every refinement), every cell is represented by the value
+#measured at its upper left pixel
+class QuadTreeMap:
+	def __init__(self, shape, coarseStep):
+		self.shape = shape
+		#cells are halved down to single pixels, so the coarse step has to be a power of two
+		self.coarseStep = 2**int(numpy.log2(max(coarseStep, 1)))
+		self.samples = {}
+		self.cells = set((iy, ix, self.coarseStep) for iy in range(0, shape[0], self.coarseStep) for ix in range(0, shape[1], self.coarseStep))
+	
+	#pixels of the current cells which have not been measured yet, line by line in alternating
+	#direction so the galvo does not have to fly back
+	def pending(self):
+		points = sorted(set((iy, ix) for iy, ix, size in self.cells if (iy, ix) not in self.samples))
+		rows = {}
+		for iy, ix in points:
+			rows.setdefault(iy, []).append((iy, ix))
+		ordered = []
+		for count, iy in enumerate(sorted(rows)):
+			ordered += rows[iy][::-1] if count % 2 == 1 else rows[iy]
+		return ordered
+	
+	def add(self, iy, ix, value):
+		self.samples[(iy, ix)] = value
+	
+	def neighbourValues(self, iy, ix, size):
+		return [self.samples[p] for p in ((iy, ix-size), (iy, ix+size), (iy-size, ix), (iy+size, ix)) if p in self.samples]
+	
+	#split every cell which is brighter than threshold or differs by more than gradient from one
+	#of its neighbours, returns the number of split cells
+	def refine(self, threshold, gradient):
+		split = []
+		for cell in self.cells:
+			iy, ix, size = cell
+			if size <= 1:
+				continue
+			value = self.samples[(iy, ix)]
+			neighbours = self.neighbourValues(iy, ix, size)
+			if value > threshold or (len(neighbours) > 0 and numpy.max(numpy.abs(numpy.array(neighbours) - value)) > gradient):
+				split += [cell]
+		for iy, ix, size in split:
+			self.cells.remove((iy, ix, size))
+			half = size // 2
+			for cy, cx in ((iy, ix), (iy, ix+half), (iy+half, ix), (iy+half, ix+half)):
+				if cy < self.shape[0] and cx < self.shape[1]:
+					self.cells.add((cy, cx, half))
+		return len(split)
+	
+	#resample onto the regular scan grid, every pixel gets the value of the cell it lies in
+	def toArray(self, out=None):
+		if out is None:
+			out = numpy.zeros(self.shape, dtype=numpy.float64)
+		for iy, ix, size in self.cells:
+			if (iy, ix) in self.samples:
+				out[iy:iy+size, ix:ix+size] = self.samples[(iy, ix)]
+		return out
+	
+	#how many pixels were measured compared to a full scan
+	def coverage(self):
+		return len(self.samples) / float(self.shape[0]*self.shape[1])
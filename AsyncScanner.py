@@ -0,0 +1,184 @@
+import asyncio
+import concurrent.futures
+import functools
+import threading
+import time
+import numpy
+from ctypes import c_int
+from Tdc import TDC_COINC_CHANNELS
+
+#asyncio layer on top of a Scanner. Every hardware call runs on one dedicated executor thread, so the tdc and
+#the card are never used by two loops at the same time. One producer per kind of data (rates, scan lines,
+#g2 correlations) publishes into a Stream and any number of views subscribe to it instead of polling the tdc
+
+#broadcast of values to any number of subscribers, a slow subscriber only loses its own oldest values
+class Stream:
+	def __init__(self, maxsize=100):
+		self.maxsize = maxsize
+		self.subscribers = []
+		self.last = None
+
+	def subscribe(self):
+		subscriber = asyncio.Queue(self.maxsize)
+		self.subscribers.append(subscriber)
+		return subscriber
+
+	def unsubscribe(self, subscriber):
+		if subscriber in self.subscribers:
+			self.subscribers.remove(subscriber)
+
+	#only call from the event loop (see AsyncScanner.publishThreadsafe for the hardware thread)
+	def publish(self, value):
+		self.last = value
+		for subscriber in self.subscribers:
+			if subscriber.full():
+				subscriber.get_nowait()
+			subscriber.put_nowait(value)
+
+	#async for value in stream.values(): ...
+	async def values(self):
+		subscriber = self.subscribe()
+		try:
+			while True:
+				yield await subscriber.get()
+		finally:
+			self.unsubscribe(subscriber)
+
+#stands in for the live view of the scanner (Scanner.renderer) and forwards the new values to a stream
+class StreamRenderer:
+	def __init__(self, owner, stream):
+		self.owner = owner
+		self.stream = stream
+		#nothing is drawn here (saveTimingProfile reads them)
+		self.drawTime = 0.0
+		self.draws = 0
+
+	def update(self, values):
+		self.owner.publishThreadsafe(self.stream, numpy.array(values))
+
+	def setData(self, data):
+		pass
+
+	def stop(self):
+		pass
+
+class AsyncScanner:
+	def __init__(self, scanner):
+		self.scanner = scanner
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+		self.loop = None
+		#(time, counters) of every new tdc frame
+		self.rates = Stream()
+		#new pixel values of a running scan
+		self.pixels = Stream()
+		#(line index, line) of a running scan
+		self.lines = Stream()
+		#(integration time, g2) of the hbt correlation
+		self.correlations = Stream()
+		self.tasks = {}
+		self._counters = (c_int*TDC_COINC_CHANNELS)()
+		self._updates = c_int()
+
+	#run a (blocking) hardware call on the hardware thread
+	async def call(self, function, *args):
+		self.loop = asyncio.get_running_loop()
+		return await self.loop.run_in_executor(self.executor, functools.partial(function, *args))
+
+	def publishThreadsafe(self, stream, value):
+		self.loop.call_soon_threadsafe(stream.publish, value)
+
+	def readCounters(self):
+		self.scanner.tdc.getCoincCounters(self._counters, self._updates)
+		return numpy.array(self._counters), self._updates.value
+
+	#producer of the rate stream: every new tdc frame (one exposure) is published once, no matter how many views
+	#are listening
+	async def streamRates(self):
+		while True:
+			counters, updates = await self.call(self.readCounters)
+			if updates > 0:
+				self.rates.publish((time.time(), counters))
+			await asyncio.sleep(self.scanner.exposureTime/2000.)
+
+	#count rate (counts/s) of the sum of all counters as a stream, starts the producer if needed
+	async def rateValues(self):
+		self.start("rates", self.streamRates())
+		async for stamp, counters in self.rates.values():
+			yield stamp, numpy.sum(counters) / (self.scanner.exposureTime/1000.)
+
+	#grid scan (xsteps x ysteps) line by line on the hardware thread, the event loop stays free in between.
+	#Pixels and lines are published, stop it with stopScan. Like Scanner.scanGrid with the scan file, the
+	#checkpoints and the timing profile, the live view of the scanner is back afterwards
+	async def scan(self):
+		scanner = self.scanner
+		scanner.interrupt = False
+		renderer = getattr(scanner, "renderer", None)
+		scanner.renderer = StreamRenderer(self, self.pixels)
+		await self.call(scanner.openScanFile)
+		try:
+			state = await self.call(scanner.gridState)
+			for countY in range(len(scanner.ysteps)):
+				try:
+					completed = await self.call(scanner.scanGridLine, countY, state, None)
+				except Exception:
+					#keep the finished lines
+					await self.call(scanner.checkpoint, countY, None, True)
+					raise
+				if not completed:
+					await self.call(scanner.checkpoint, countY, None, True)
+					return False
+				await self.call(scanner.streamLine, countY)
+				await self.call(scanner.checkpoint, countY+1)
+				self.lines.publish((countY, numpy.array(scanner.dataArray[countY])))
+			return True
+		finally:
+			await self.call(scanner.closeScanFile)
+			await self.call(scanner.saveTimingProfile)
+			if renderer is None:
+				del scanner.renderer
+			else:
+				scanner.renderer = renderer
+
+	def stopScan(self):
+		self.scanner.interrupt = True
+
+	#producer of the correlation stream: g2 of the hbt function every interval seconds
+	async def correlate(self, interval=1.0):
+		tdc = self.scanner.tdc
+		function = await self.call(tdc.createHbtFunction)
+		try:
+			await self.call(tdc.resetHbtCorrelations)
+			startTime = time.time()
+			while True:
+				await asyncio.sleep(interval)
+				await self.call(tdc.calcHbtG2, function)
+				self.correlations.publish((time.time() - startTime, numpy.array(function[0][:], dtype=numpy.float64)))
+		finally:
+			await self.call(tdc.releaseHbtFunction, function)
+
+	#run a producer (or any coroutine) as a named task, a task with the same name keeps running
+	def start(self, name, coroutine):
+		if name in self.tasks and not self.tasks[name].done():
+			coroutine.close()
+			return self.tasks[name]
+		self.tasks[name] = asyncio.ensure_future(coroutine)
+		return self.tasks[name]
+
+	def stop(self, name):
+		if name in self.tasks:
+			self.tasks.pop(name).cancel()
+
+	async def close(self):
+		for name in list(self.tasks):
+			self.stop(name)
+		await asyncio.sleep(0)
+		self.executor.shutdown(wait=True)
+
+#event loop on a thread of its own for guis with their own main loop (tk): submit coroutines with
+#asyncio.run_coroutine_threadsafe(coroutine, loop)
+def startLoop():
+	loop = asyncio.new_event_loop()
+	thread = threading.Thread(target=loop.run_forever, name="AsyncScannerLoop")
+	thread.daemon = True
+	thread.start()
+	return loop
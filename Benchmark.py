@@ -0,0 +1,197 @@
+import argparse
+import json
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import numpy
+
+#benchmarks of the acquisition and analysis hot paths against the simulated tdc, daq and camera (Tdc.py,
+#Daq.py, Camera.py): latency per operation and throughput, written as json. Compared with a baseline (the
+#result file of an earlier run) every benchmark which got slower than the tolerance is reported and the exit
+#code is 1, so a slower scan loop is noticed before it runs on the instrument
+#usage: python -m Benchmark [--output benchmark.json] [--baseline benchmark_baseline.json] [--tolerance 0.25]
+#                           [--repeat 5] [--only setPoint,scanPixel,...] [--updateBaseline] [--config scanner_config.cfg]
+
+def openScanner(config):
+	import Scanner
+	scanner = Scanner.Scanner(configFile=config, camera=False, headless=True, tdc="simulated", daq="simulated", cameraDevice="simulated")
+	#the benchmark scans must not end up in the profile of the real scans (a config may set one)
+	scanner.timingProfile = None
+	scanner.waitReady()
+	return scanner
+
+#grid of count x count pixels around the center of the sample (mm)
+def setGrid(scanner, count, width=0.004):
+	scanner.xsteps = numpy.linspace(-width/2., width/2., count)
+	scanner.ysteps = numpy.linspace(-width/2., width/2., count)
+	scanner.dataArray = scanner.allocateArray((count, count))
+	scanner.voltageTables()
+
+#every benchmark prepares its operation and returns (operations, run), run does all of them once
+
+def benchSetPoint(scanner, directory):
+	rng = numpy.random.default_rng(0)
+	points = list(zip(rng.uniform(-0.002, 0.002, 200), rng.uniform(-0.002, 0.002, 200)))
+	def run():
+		for x, y in points:
+			scanner.setPoint(x, y)
+	return len(points), run
+
+def scanPixel(scanMode, count):
+	def bench(scanner, directory):
+		scanner.scanMode = scanMode
+		scanner.acquisition = "counters"
+		scanner.exposureTime = 1
+		scanner.tdc.setExposureTime(scanner.exposureTime)
+		setGrid(scanner, count)
+		return count*count, scanner.scanSample
+	return bench
+
+def benchHbtUpdate(scanner, directory):
+	scanner.doNormalization = True
+	scanner.tdc.setHbtParams(int(1e-9 / scanner.tdc.getTimebase()), 20)
+	hbtFunction = scanner.tdc.createHbtFunction()
+	def run():
+		#every round starts with empty correlations like a reset in showHBT
+		scanner.tdc.resetHbtCorrelations()
+		for i in range(100):
+			scanner.hbtG2(hbtFunction)
+	return 100, run
+
+def benchSaveState(scanner, directory):
+	scanner.dataArray = numpy.random.default_rng(0).poisson(1000., (400, 400)).astype(numpy.float64)
+	name = os.path.join(directory, "state")
+	def run():
+		scanner.saveState(name)
+	return 1, run
+
+#planes of a focus stack as plot3dmap gets them (one file per focus)
+def focusFiles(directory, planes=10, size=100):
+	rng = numpy.random.default_rng(0)
+	files = []
+	for plane in range(planes):
+		name = os.path.join(directory, "focus%d.npy"%plane)
+		numpy.save(name, rng.poisson(50000., (size, size)).astype(numpy.float64))
+		files.append(name)
+	return files
+
+def benchFocusStack(scanner, directory):
+	files = focusFiles(directory)
+	def run():
+		scanner.focusStack(files)
+	return 1, run
+
+def benchPlot3dmap(scanner, directory):
+	import matplotlib
+	matplotlib.use("Agg")
+	import matplotlib.pyplot as plt
+	files = focusFiles(directory)
+	def run():
+		fig = plt.figure()
+		scanner.plot3dmap(files, multiple=True, fig=fig)
+		fig.canvas.draw()
+		plt.close(fig)
+	return 1, run
+
+#name, benchmark and what one operation is
+benchmarks = [
+	("setPoint", benchSetPoint, "move"),
+	("scanPixel", scanPixel("point", 15), "pixel"),
+	("scanPixelWaveform", scanPixel("waveform", 30), "pixel"),
+	("hbtUpdate", benchHbtUpdate, "update"),
+	("saveState", benchSaveState, "400x400 map"),
+	("focusStack", benchFocusStack, "10 planes of 100x100"),
+	("plot3dmap", benchPlot3dmap, "10 planes of 100x100"),
+]
+
+#run once to warm up, then repeat times: latency is the median of the seconds per operation of the rounds
+def measure(operations, run, repeat):
+	run()
+	rounds = []
+	for i in range(repeat):
+		start = time.perf_counter()
+		run()
+		rounds.append((time.perf_counter() - start) / operations)
+	latency = float(numpy.median(rounds))
+	return {"operations" : operations, "repeat" : repeat, "latency" : latency, "best" : min(rounds), "worst" : max(rounds), "throughput" : 1./latency if latency > 0 else None}
+
+def runBenchmarks(scanner, names, repeat):
+	results = {}
+	directory = tempfile.mkdtemp(prefix="benchmark")
+	try:
+		for name, bench, unit in benchmarks:
+			if names is not None and name not in names:
+				continue
+			try:
+				operations, run = bench(scanner, directory)
+			except ImportError as error:
+				#e.g. plot3dmap without matplotlib
+				results[name] = {"skipped" : str(error)}
+				print("%-18s skipped (%s)"%(name, error))
+				continue
+			results[name] = measure(operations, run, repeat)
+			results[name]["unit"] = unit
+			print("%-18s %12s per %-20s %12.1f /s"%(name, formatLatency(results[name]["latency"]), unit, results[name]["throughput"] or 0))
+	finally:
+		shutil.rmtree(directory, ignore_errors=True)
+	return results
+
+def formatLatency(seconds):
+	if seconds < 1e-3:
+		return "%.1f us"%(seconds*1e6)
+	if seconds < 1.:
+		return "%.2f ms"%(seconds*1e3)
+	return "%.2f s"%seconds
+
+#latency ratios (new / baseline) of the benchmarks both have, slower: the ones above 1 + tolerance
+def compare(results, baseline, tolerance):
+	ratios = {}
+	slower = []
+	for name, result in sorted(results.items()):
+		old = baseline.get("benchmarks", {}).get(name, {})
+		if "latency" not in result or "latency" not in old or old["latency"] <= 0:
+			continue
+		ratios[name] = result["latency"] / old["latency"]
+		if ratios[name] > 1. + tolerance:
+			slower.append(name)
+		print("%-18s %12s -> %12s   x%.2f%s"%(name, formatLatency(old["latency"]), formatLatency(result["latency"]), ratios[name], "   SLOWER" if name in slower else ""))
+	return ratios, slower
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="Benchmark", description="latency and throughput of the scan and analysis hot paths with simulated hardware")
+	parser.add_argument("--config", default="scanner_config.cfg", help="config of the scanner")
+	parser.add_argument("--output", default="benchmark.json", help="json file for the results")
+	parser.add_argument("--baseline", default="benchmark_baseline.json", help="results to compare with (skipped if the file does not exist)")
+	parser.add_argument("--tolerance", type=float, default=0.25, help="fraction a benchmark may be slower than the baseline")
+	parser.add_argument("--repeat", type=int, default=5, help="measured rounds per benchmark (after one warm up round)")
+	parser.add_argument("--only", default=None, help="comma separated names of the benchmarks to run")
+	parser.add_argument("--updateBaseline", action="store_true", help="write the results to the baseline as well")
+	args = parser.parse_args(argv)
+	names = None
+	if args.only is not None:
+		names = [name.strip() for name in args.only.split(",")]
+		unknown = set(names) - set(name for name, bench, unit in benchmarks)
+		if unknown:
+			parser.error("unknown benchmarks: %s"%", ".join(sorted(unknown)))
+	scanner = openScanner(args.config)
+	try:
+		results = runBenchmarks(scanner, names, args.repeat)
+	finally:
+		scanner.ReleaseObjects()
+	report = {"created" : time.strftime("%Y-%m-%d %H:%M:%S"), "python" : sys.version.split()[0], "numpy" : numpy.__version__, "platform" : sys.platform, "initTiming" : scanner.initTiming, "benchmarks" : results}
+	slower = []
+	if os.path.isfile(args.baseline) and not args.updateBaseline:
+		baseline = json.loads(open(args.baseline).read())
+		print("compared with %s (%s):"%(args.baseline, baseline.get("created", "?")))
+		ratios, slower = compare(results, baseline, args.tolerance)
+		report["baseline"] = {"file" : args.baseline, "created" : baseline.get("created"), "tolerance" : args.tolerance, "ratios" : ratios, "slower" : slower}
+	open(args.output, "w").write(json.dumps(report, indent=1))
+	if args.updateBaseline:
+		open(args.baseline, "w").write(json.dumps(report, indent=1))
+		print("baseline %s updated"%args.baseline)
+	return 1 if slower else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,214 @@
+import time
+import numpy
+
+#cameras looking at the sample. FlyCaptureCamera is the point grey camera behind pyflycam (FlyCapture2_C.dll),
+#SimulatedCamera renders the laser spot at the position of the galvos. Frames are numpy arrays (rows, cols) of
+#8 bit grey values
+
+#"flycapture", "simulated" or a camera object
+def openCamera(camera="flycapture"):
+	if camera == "flycapture":
+		return FlyCaptureCamera()
+	if camera == "simulated":
+		return SimulatedCamera()
+	return camera
+
+#8 bit grey png without any imaging library
+def writePng(name, frame):
+	import struct
+	import zlib
+	frame = numpy.ascontiguousarray(frame, dtype=numpy.uint8)
+	rows, cols = frame.shape
+	#every row starts with its filter type (0: none)
+	raw = numpy.hstack([numpy.zeros((rows, 1), dtype=numpy.uint8), frame]).tobytes()
+	def chunk(kind, data):
+		return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+	with open(name, "wb") as f:
+		f.write(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", cols, rows, 8, 0, 0, 0, 0)) + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b""))
+
+class FlyCaptureCamera:
+	def __init__(self):
+		import pyflycam
+		self.lib = pyflycam
+		self.connected = False
+		self.capturing = False
+
+	def attach(self, scanner):
+		pass
+
+	#connect to the first camera
+	def connect(self):
+		fc = self.lib
+		self._context = fc.fc2Context()
+		self._guid = fc.fc2PGRGuid()
+		self._numCameras = fc.c_uint()
+
+		error = fc.fc2CreateContext(self._context)
+		if error != fc.FC2_ERROR_OK.value:
+			print("Error in fc2CreateContext: " + str(error))
+
+		error = fc.fc2GetNumOfCameras(self._context, self._numCameras)
+		if error != fc.FC2_ERROR_OK.value:
+			print("Error in fc2GetNumOfCameras: " + str(error))
+		if self._numCameras == 0:
+			print("No Cameras detected")
+
+		#get the first camera
+		error = fc.fc2GetCameraFromIndex(self._context, 0, self._guid)
+		if error != fc.FC2_ERROR_OK.value:
+			print("Error in fc2GetCameraFromIndex: " + str(error))
+
+		error = fc.fc2Connect(self._context, self._guid)
+		if error!= fc.FC2_ERROR_OK.value:
+			print("Error in fc2Connect: " + str(error))
+		self.connected = True
+
+	def disconnect(self):
+		self.lib.fc2StopCapture(self._context)
+		self.lib.fc2DestroyContext(self._context)
+		self.connected = False
+		self.capturing = False
+
+	#gain in dB, shutter in ms
+	def setImageProperties(self, gain=0.0, shutter=10.0):
+		fc = self.lib
+		gainProp = fc.fc2Property()
+		shutterProp = fc.fc2Property()
+		gainProp.type = fc.FC2_GAIN
+		shutterProp.type = fc.FC2_SHUTTER
+
+		#retrieve current settings
+		fc.fc2GetProperty(self._context, gainProp)
+		fc.fc2GetProperty(self._context, shutterProp)
+
+		gainProp.absValue = gain
+		shutterProp.absValue = shutter
+
+		fc.fc2SetProperty(self._context, gainProp)
+		fc.fc2SetProperty(self._context, shutterProp)
+
+	def startCapture(self):
+		self.lib.fc2StartCapture(self._context)
+		self.capturing = True
+
+	def stopCapture(self):
+		self.lib.fc2StopCapture(self._context)
+		self.capturing = False
+
+	#the next frame as it comes from the camera (raw 8 bit)
+	def retrieveFrame(self):
+		fc = self.lib
+		rawImage = fc.fc2Image()
+		fc.fc2CreateImage(rawImage)
+		fc.fc2RetrieveBuffer(self._context, rawImage)
+		frame = numpy.ctypeslib.as_array(rawImage.pData, shape=(rawImage.rows, rawImage.stride))[:, :rawImage.cols].copy()
+		fc.fc2DestroyImage(rawImage)
+		return frame
+
+	#the next frame as png (converted by the library)
+	def saveFrame(self, name):
+		fc = self.lib
+		#create the two pictures one for getting input the other to save
+		rawImage = fc.fc2Image()
+		convertedImage = fc.fc2Image()
+		fc.fc2CreateImage(rawImage)
+		fc.fc2CreateImage(convertedImage)
+
+		fc.fc2RetrieveBuffer(self._context, rawImage)
+		fc.fc2ConvertImageTo(fc.FC2_PIXEL_FORMAT_BGR, rawImage, convertedImage)
+		fc.fc2SaveImage(convertedImage, name.encode('utf-8'), 6)
+
+		fc.fc2DestroyImage(rawImage)
+		fc.fc2DestroyImage(convertedImage)
+
+#camera looking at the sample plane through the objective: a gaussian laser spot (spotSize mm) at the sample
+#position of the focus (Scanner.samplePosition, the galvo model of a simulated daq) with shot and read noise.
+#Frames come every 1/frameRate seconds from the start of the capture, retrieveFrame waits for the next one
+class SimulatedCamera:
+	def __init__(self, rows=480, cols=640, frameRate=30.0, seed=None):
+		self.rows = rows
+		self.cols = cols
+		self.frameRate = frameRate
+		self.rng = numpy.random.default_rng(seed)
+		self.clock = time.perf_counter
+		self.scanner = None
+		self.connected = False
+		#mm per pixel and the mm of the sample in the center of the frame
+		self.pixelSize = 0.0002
+		self.center = (0., 0.)
+		self.spotSize = 0.0006
+		#grey value of the spot center with a shutter of 10 ms and no gain
+		self.spotPeak = 150.
+		self.darkLevel = 8.
+		self.readNoise = 2.
+		self.gain = 0.
+		self.shutter = 10.
+		self.start = self.clock()
+		self.frame = -1
+		self.capturing = False
+		self.darkFrames = None
+
+	def attach(self, scanner):
+		self.scanner = scanner
+
+	def connect(self):
+		self.connected = True
+
+	def disconnect(self):
+		self.capturing = False
+		self.connected = False
+
+	def setImageProperties(self, gain=0.0, shutter=10.0):
+		self.gain = gain
+		self.shutter = shutter
+
+	def startCapture(self):
+		self.start = self.clock()
+		self.frame = -1
+		self.capturing = True
+
+	def stopCapture(self):
+		self.capturing = False
+
+	#position of the spot in mm when frame was exposed
+	def spotPosition(self, at):
+		if self.scanner is None:
+			return 0., 0.
+		xs, ys = self.scanner.samplePosition(numpy.array([at]))
+		return float(xs[0]), float(ys[0])
+
+	#dark level with its shot and read noise
+	def noise(self, level, shape):
+		return numpy.clip(self.rng.poisson(level) + self.rng.normal(0., self.readNoise, shape), 0, 255).astype(numpy.uint8)
+
+	def render(self, at):
+		if self.darkFrames is None:
+			#noise of the whole frame is the expensive part, so a few dark frames are made once and reused
+			self.darkFrames = [self.noise(numpy.full((self.rows, self.cols), self.darkLevel), (self.rows, self.cols)) for i in range(8)]
+		frame = self.darkFrames[self.rng.integers(len(self.darkFrames))].copy()
+		x, y = self.spotPosition(at)
+		sigma = self.spotSize / self.pixelSize / 2.
+		cx = (self.cols - 1) / 2. + (x - self.center[0]) / self.pixelSize
+		cy = (self.rows - 1) / 2. + (y - self.center[1]) / self.pixelSize
+		#only the pixels within 4 sigma of the spot get new noise
+		rows = numpy.arange(max(int(cy - 4*sigma), 0), min(int(cy + 4*sigma) + 2, self.rows))
+		cols = numpy.arange(max(int(cx - 4*sigma), 0), min(int(cx + 4*sigma) + 2, self.cols))
+		if len(rows) > 0 and len(cols) > 0:
+			#the gaussian is separable, two vectors instead of a grid of exponentials
+			spot = numpy.outer(numpy.exp(-(rows - cy)**2 / (2*sigma**2)), numpy.exp(-(cols - cx)**2 / (2*sigma**2)))
+			scale = self.shutter / 10. * 10**(self.gain / 20.)
+			frame[rows[0]:rows[-1]+1, cols[0]:cols[-1]+1] = self.noise(spot * self.spotPeak * scale + self.darkLevel, spot.shape)
+		return frame
+
+	def retrieveFrame(self):
+		#frames are never delivered twice, wait for the one after the last
+		frame = max(int((self.clock() - self.start) * self.frameRate), self.frame) + 1
+		at = self.start + frame / self.frameRate
+		wait = at - self.clock()
+		if wait > 0:
+			time.sleep(wait)
+		self.frame = frame
+		return self.render(at)
+
+	def saveFrame(self, name):
+		writePng(name, self.retrieveFrame())
@@ -0,0 +1,217 @@
+import time
+import numpy
+from ctypes import *
+
+#data acquisition cards the scanner writes the galvo and piezo voltages with. NidaqDaq creates the PyDAQmx
+#tasks of the ni card, SimulatedDaq creates tasks with the same methods which record every waveform and model
+#the galvos (so a simulated tdc sees the focus where it really would be) and the latency of the driver calls
+
+#values of NIDAQmx.h the scanner uses (here, so they exist without the ni driver)
+DAQmx_Val_Volts = 10348
+DAQmx_Val_Rising = 10280
+DAQmx_Val_FiniteSamps = 10178
+DAQmx_Val_ContSamps = 10123
+DAQmx_Val_GroupByChannel = 0
+DAQmx_Val_Cfg_Default = -1
+DAQmx_Val_OnDemand = 10390
+DAQmx_Val_StartTrigger = 12491
+#types of the PyDAQmx arguments
+int32 = c_int32
+bool32 = c_uint32
+
+#"nidaq", "simulated" or a daq object
+def openDaq(daq="nidaq"):
+	if daq == "nidaq":
+		return NidaqDaq()
+	if daq == "simulated":
+		return SimulatedDaq()
+	return daq
+
+class NidaqDaq:
+	def __init__(self):
+		#needs the ni driver
+		import PyDAQmx
+		self.lib = PyDAQmx
+
+	#scanner the card positions (the simulator triggers its tdc)
+	def attach(self, scanner):
+		pass
+
+	def createTask(self):
+		return self.lib.Task()
+
+#output or input task of the simulated card. Only what the scanner uses: on demand writes to a running task,
+#finite and continuous sample clocked waveforms (a continuous one holds its last sample) and finite reads of
+#the galvo position
+class SimulatedTask:
+	def __init__(self, daq):
+		self.daq = daq
+		self.channels = 0
+		self.input = False
+		self.timing = DAQmx_Val_OnDemand
+		self.rate = 1000.
+		self.samples = 0
+		self.buffer = None
+		self.running = False
+		self.start = 0.
+		self.end = 0.
+		self.exported = []
+
+	def CreateAOVoltageChan(self, physicalChannel, name, minVal, maxVal, units, scale):
+		self.daq.call("configure")
+		self.channels += len(physicalChannel.split(","))
+
+	def CreateAIVoltageChan(self, physicalChannel, name, config, minVal, maxVal, units, scale):
+		self.daq.call("configure")
+		self.channels += len(physicalChannel.split(","))
+		self.input = True
+
+	def CfgSampClkTiming(self, source, rate, activeEdge, sampleMode, samples):
+		self.daq.call("configure")
+		self.timing = sampleMode
+		self.rate = float(rate)
+		self.samples = samples
+
+	def SetSampTimingType(self, timingType):
+		self.daq.call("configure")
+		self.timing = timingType
+
+	def ExportSignal(self, signal, terminal):
+		self.daq.call("configure")
+		if signal not in self.exported:
+			self.exported.append(signal)
+
+	def WriteAnalogF64(self, samples, autoStart, timeout, layout, data, written, reserved):
+		self.daq.call("write")
+		values = numpy.array(numpy.asarray(data, dtype=numpy.float64).reshape((self.channels, -1))[:, :samples])
+		if self.running and self.timing == DAQmx_Val_OnDemand:
+			self.daq.output(numpy.array([self.daq.clock()]), values[:, :1].T)
+		else:
+			self.buffer = values
+		if written is not None:
+			written._obj.value = samples
+
+	def StartTask(self):
+		self.daq.call("start")
+		self.running = True
+		self.start = self.daq.clock()
+		self.end = self.start
+		if self.input or self.timing == DAQmx_Val_OnDemand or self.buffer is None:
+			return
+		samples = self.buffer.shape[1]
+		self.end = self.start + samples / self.rate
+		self.daq.output(self.start + numpy.arange(samples) / self.rate, self.buffer.T)
+		self.daq.records.append((self.start, self.rate, self.buffer))
+		if DAQmx_Val_StartTrigger in self.exported:
+			self.daq.startTrigger(self.start)
+
+	def StopTask(self):
+		self.daq.call("stop")
+		if self.running and not self.input:
+			#the card keeps the last sample it put out
+			self.daq.truncate(self.daq.clock())
+		self.running = False
+
+	def ClearTask(self):
+		self.StopTask()
+		self.buffer = None
+
+	def IsTaskDone(self, done):
+		done._obj.value = not self.running or self.timing == DAQmx_Val_FiniteSamps and self.daq.clock() >= self.end
+
+	def WaitUntilTaskDone(self, timeout):
+		if self.timing == DAQmx_Val_FiniteSamps:
+			time.sleep(min(max(self.end - self.daq.clock(), 0.), timeout))
+
+	#the position signal of the phi galvo, sampled from the start of the task
+	def ReadAnalogF64(self, samples, timeout, layout, data, size, read, reserved):
+		self.daq.call("read")
+		times = self.start + numpy.arange(samples) / self.rate
+		time.sleep(min(max(times[-1] - self.daq.clock(), 0.), timeout))
+		values = numpy.asarray(data).reshape(-1)
+		values[:samples] = self.daq.galvoVoltages(times)[0]
+		if read is not None:
+			read._obj.value = samples
+
+#card with its galvos: every output sample is a step the galvo follows exponentially with a time constant of
+#galvoTime + galvoTimePerVolt*step after the tracking delay galvoLag. Steps written on demand start from the
+#position the galvo really has, the samples of a waveform from the previous sample (they are small)
+class SimulatedDaq:
+	def __init__(self):
+		self.scanner = None
+		self.clock = time.perf_counter
+		self.galvoTime = 0.00005
+		self.galvoTimePerVolt = 0.0005
+		self.galvoLag = 0.0001
+		#seconds every driver call takes
+		self.latency = {"configure" : 0.0002, "write" : 0.00005, "start" : 0.001, "stop" : 0.0005, "read" : 0.0002}
+		#number of calls and seconds spent in them per kind of call
+		self.calls = {}
+		#(start, sample rate, samples (channel, sample)) of every sample clocked waveform
+		self.records = []
+		#the galvo model only looks back historyTime seconds
+		self.historyTime = 10.
+		self.times = numpy.zeros((1,))
+		self.values = numpy.zeros((1, 3))
+		self.origins = numpy.zeros((1, 3))
+		self.constants = numpy.full((1,), self.galvoTime)
+		self.pending = []
+		self.last = numpy.zeros((3,))
+
+	def attach(self, scanner):
+		self.scanner = scanner
+
+	def createTask(self):
+		return SimulatedTask(self)
+
+	def call(self, kind):
+		latency = self.latency.get(kind, 0.)
+		if latency > 0:
+			time.sleep(latency)
+		count, seconds = self.calls.get(kind, (0, 0.))
+		self.calls[kind] = (count + 1, seconds + latency)
+
+	#the line trigger goes to the marker channel of the tdc (if it is simulated as well)
+	def startTrigger(self, at):
+		if self.scanner is not None and hasattr(self.scanner, "tdc") and hasattr(self.scanner.tdc, "trigger"):
+			self.scanner.tdc.trigger(self.scanner.markerChannel, at)
+
+	#output values (sample, channel) from times on
+	def output(self, times, values):
+		values = values[:, :3]
+		if len(times) == 1:
+			origins = self.galvoVoltages(times + self.galvoLag).T
+		else:
+			origins = numpy.concatenate([self.last[None, :len(values[0])], values[:-1]])
+		steps = numpy.max(numpy.abs(values[:, :2] - origins[:, :2]), axis=1)
+		self.pending.append((times, values, origins, self.galvoTime + self.galvoTimePerVolt*steps))
+		self.last = values[-1]
+
+	#forget the samples which were not put out before a stop
+	def truncate(self, at):
+		self.merge()
+		keep = self.times <= at
+		keep[0] = True
+		self.times, self.values, self.origins, self.constants = self.times[keep], self.values[keep], self.origins[keep], self.constants[keep]
+		self.last = self.values[-1]
+
+	def merge(self):
+		if not self.pending:
+			return
+		self.times = numpy.concatenate([self.times] + [times for times, values, origins, constants in self.pending])
+		self.values = numpy.concatenate([self.values] + [values for times, values, origins, constants in self.pending])
+		self.origins = numpy.concatenate([self.origins] + [origins for times, values, origins, constants in self.pending])
+		self.constants = numpy.concatenate([self.constants] + [constants for times, values, origins, constants in self.pending])
+		self.pending = []
+		old = numpy.searchsorted(self.times, self.clock() - self.historyTime) - 1
+		if old > 0:
+			self.times, self.values, self.origins, self.constants = self.times[old:], self.values[old:], self.origins[old:], self.constants[old:]
+
+	#voltages (phi, theta, piezo) the galvos and the piezo really have at times (clock of the simulator)
+	def galvoVoltages(self, times):
+		self.merge()
+		times = numpy.asarray(times, dtype=numpy.float64) - self.galvoLag
+		index = numpy.maximum(numpy.searchsorted(self.times, times, side="right") - 1, 0)
+		decay = numpy.exp(-numpy.maximum(times - self.times[index], 0.) / self.constants[index])
+		voltages = self.values[index] + (self.origins[index] - self.values[index]) * decay[..., None]
+		return numpy.moveaxis(voltages, -1, 0)
@@ -0,0 +1,96 @@
+import time
+import numpy
+
+#renders a scan image at a fixed frame rate from a canvas timer, so the acquisition loop only
+#reports new values and never waits for matplotlib
+class ScanRenderer:
+	def __init__(self, figure, axes, image, data, frameRate=10.0):
+		self.figure = figure
+		self.axes = axes
+		self.image = image
+		self.data = data
+		self.frameRate = frameRate
+		#running color limits, only updated with the values which were just acquired
+		self.vmin = None
+		self.vmax = None
+		self.dirty = False
+		self.background = None
+		#time spent drawing (s) and number of frames, for the timing profile of the scanner
+		self.drawTime = 0.0
+		self.draws = 0
+		self.timer = figure.canvas.new_timer(interval=int(1000.0/frameRate))
+		self.timer.add_callback(self.draw)
+
+	#called by the acquisition for every new pixel (or line), cost does not depend on the map size
+	def update(self, values):
+		#lost pixels (NaN) are left out
+		values = numpy.asarray(values, dtype=numpy.float64)
+		values = values[numpy.isfinite(values)]
+		if values.size == 0:
+			return
+		lo = numpy.min(values)
+		hi = numpy.max(values)
+		if self.vmin is None or lo < self.vmin:
+			self.vmin = lo
+		if self.vmax is None or hi > self.vmax:
+			self.vmax = hi
+		self.dirty = True
+
+	#show a different array (e.g. the next region of a batch), the color limits start over
+	def setData(self, data):
+		self.data = data
+		self.image.set_data(data)
+		self.image.set_extent((-0.5, data.shape[1]-0.5, data.shape[0]-0.5, -0.5))
+		self.vmin = None
+		self.vmax = None
+		#the axes limits changed, so the blitting background has to be redrawn
+		self.background = None
+		self.dirty = True
+
+	def start(self):
+		#draw everything once and remember the static parts (axes, ticks) for blitting
+		self.figure.canvas.draw()
+		self.background = self.figure.canvas.copy_from_bbox(self.axes.bbox)
+		self.timer.start()
+
+	def stop(self):
+		self.timer.stop()
+		#make sure the final state is shown
+		self.draw()
+
+	def draw(self):
+		if not self.dirty:
+			return
+		self.dirty = False
+		start = time.perf_counter()
+		canvas = self.figure.canvas
+		self.image.set_data(self.data)
+		if self.vmin is not None and self.vmin < self.vmax:
+			self.image.set_clim(self.vmin, self.vmax)
+		if self.background is None:
+			canvas.draw()
+			self.background = canvas.copy_from_bbox(self.axes.bbox)
+		else:
+			canvas.restore_region(self.background)
+			self.axes.draw_artist(self.image)
+			canvas.blit(self.axes.bbox)
+		self.drawTime += time.perf_counter() - start
+		self.draws += 1
+
+#stands in for the renderer when nothing is shown (headless scans)
+class NullRenderer:
+	def __init__(self):
+		self.drawTime = 0.0
+		self.draws = 0
+
+	def update(self, values):
+		pass
+
+	def setData(self, data):
+		pass
+
+	def start(self):
+		pass
+
+	def stop(self):
+		pass
@@ -0,0 +1,181 @@
+import json
+import os
+import time
+import numpy
+
+#chunked scan container: a directory with meta.json (axes, settings of the scanner, timing) and the counts in
+#chunks of chunkLines lines per plane (chunk_<z>_<n>.npy). The writer stores every line as soon as it is scanned,
+#the reader only maps the chunks a slice touches
+
+#convert settings to something json can store, raises TypeError for everything else (tasks, ctypes, figures)
+def jsonValue(value):
+	if isinstance(value, (numpy.ndarray, numpy.generic)):
+		return value.tolist()
+	if value is None or isinstance(value, (bool, int, float, str)):
+		return value
+	if isinstance(value, (list, tuple)):
+		return [jsonValue(entry) for entry in value]
+	if isinstance(value, dict):
+		return dict((str(key), jsonValue(entry)) for key, entry in value.items())
+	raise TypeError("%s can not be stored in a scan file"%type(value).__name__)
+
+#value of the lines which were not scanned (yet)
+def fillValue(dtype):
+	return numpy.nan if numpy.dtype(dtype).kind == 'f' else 0
+
+def chunkFile(path, z, chunk):
+	return os.path.join(path, "chunk_%d_%d.npy"%(z, chunk))
+
+def writeJson(name, content):
+	#temporary file first, readers never see a half written meta.json
+	with open(name+".tmp", "w") as f:
+		f.write(json.dumps(content, indent=1))
+	os.replace(name+".tmp", name)
+
+class ScanWriter:
+	#zsteps None: a single plane. append keeps the chunks which are already there (resumed scans)
+	def __init__(self, path, xsteps, ysteps, zsteps=None, settings=None, chunkLines=16, append=False):
+		self.path = path
+		if not os.path.isdir(path):
+			os.makedirs(path)
+		if not append:
+			for name in os.listdir(path):
+				if name.startswith("chunk_") and name.endswith(".npy"):
+					os.remove(os.path.join(path, name))
+		self.chunkLines = max(int(chunkLines), 1)
+		self.lines = len(ysteps)
+		metaFile = os.path.join(path, "meta.json")
+		if append and os.path.isfile(metaFile):
+			#a resumed scan keeps the dtype and line shape (readers of the chunks written so far) and the
+			#timing of the lines before the interruption
+			self.meta = json.loads(open(metaFile).read())
+			self.chunkLines = self.meta["chunkLines"]
+			if settings is not None:
+				self.meta["settings"] = settings
+			self.meta["timing"]["end"] = None
+			self.start = self.meta["timing"]["start"]
+		else:
+			self.start = time.time()
+			self.meta = {
+				"format" : "scanfile",
+				"version" : 1,
+				"shape" : [1 if zsteps is None else len(zsteps), len(ysteps), len(xsteps)],
+				"dtype" : None,
+				"chunkLines" : self.chunkLines,
+				"axes" : {"x" : jsonValue(numpy.asarray(xsteps)), "y" : jsonValue(numpy.asarray(ysteps)), "z" : None if zsteps is None else jsonValue(numpy.asarray(zsteps))},
+				"settings" : {} if settings is None else settings,
+				"timing" : {"start" : self.start, "end" : None, "lines" : []}
+			}
+		self.chunks = {}
+		writeJson(os.path.join(path, "meta.json"), self.meta)
+
+	#store line y of plane z, values is a line of the map (x) or of counter vectors (x, counter)
+	def writeLine(self, y, values, z=0):
+		values = numpy.asarray(values)
+		if self.meta["dtype"] is None:
+			self.meta["dtype"] = values.dtype.str
+			self.meta["shape"] = self.meta["shape"][:2] + list(values.shape)
+		chunk = y // self.chunkLines
+		if (z, chunk) not in self.chunks:
+			self.chunks[(z, chunk)] = self.openChunk(z, chunk, values)
+		data = self.chunks[(z, chunk)]
+		data[y - chunk*self.chunkLines] = values
+		data.flush()
+		self.meta["timing"]["lines"].append([z, y, time.time() - self.start])
+		if y == min((chunk+1)*self.chunkLines, self.lines) - 1:
+			#last line of the chunk, release the mapping and tell the readers
+			del self.chunks[(z, chunk)]
+			writeJson(os.path.join(self.path, "meta.json"), self.meta)
+
+	def openChunk(self, z, chunk, values):
+		from numpy.lib.format import open_memmap
+		name = chunkFile(self.path, z, chunk)
+		shape = (min(self.chunkLines, self.lines - chunk*self.chunkLines),) + values.shape
+		if os.path.isfile(name):
+			data = numpy.load(name, mmap_mode="r+")
+			if data.shape == shape and data.dtype == values.dtype:
+				return data
+			del data
+		data = open_memmap(name, mode="w+", dtype=values.dtype, shape=shape)
+		data[...] = fillValue(values.dtype)
+		return data
+
+	#timing: additional timing information of the scanner (e.g. the ao writes)
+	def close(self, timing=None):
+		self.chunks = {}
+		self.meta["timing"]["end"] = time.time()
+		if timing is not None:
+			self.meta["timing"].update(timing)
+		writeJson(os.path.join(self.path, "meta.json"), self.meta)
+
+#write a finished map (y, x) or volume (z, y, x) at once
+def writeScan(path, data, xsteps, ysteps, zsteps=None, settings=None, chunkLines=16):
+	writer = ScanWriter(path, xsteps, ysteps, zsteps, settings, chunkLines)
+	planes = [data] if zsteps is None else data
+	for z, plane in enumerate(planes):
+		for y in range(len(ysteps)):
+			writer.writeLine(y, plane[y], z)
+	writer.close()
+
+#lazy reader: scan[y, x] (scan[z, y, x] for volumes) with ints, slices or index lists only loads the chunks
+#which contain the selected lines
+class ScanFile:
+	def __init__(self, path):
+		self.path = path
+		self.meta = json.loads(open(os.path.join(path, "meta.json")).read())
+		self.chunkLines = self.meta["chunkLines"]
+		self.dtype = numpy.dtype(self.meta["dtype"] if self.meta["dtype"] is not None else numpy.float64)
+		self.xsteps = numpy.array(self.meta["axes"]["x"])
+		self.ysteps = numpy.array(self.meta["axes"]["y"])
+		self.zsteps = None if self.meta["axes"]["z"] is None else numpy.array(self.meta["axes"]["z"])
+		self.settings = self.meta["settings"]
+		self.volume = self.zsteps is not None
+		shape = tuple(self.meta["shape"])
+		self.shape = shape if self.volume else shape[1:]
+		self.lineShape = shape[2:]
+
+	def chunk(self, z, chunk):
+		name = chunkFile(self.path, z, chunk)
+		if os.path.isfile(name):
+			return numpy.load(name, mmap_mode="r")
+		#nothing scanned there yet
+		rows = min(self.chunkLines, len(self.ysteps) - chunk*self.chunkLines)
+		return numpy.full((rows,) + self.lineShape, fillValue(self.dtype), dtype=self.dtype)
+
+	def __getitem__(self, key):
+		if not isinstance(key, tuple):
+			key = (key,)
+		if not self.volume:
+			key = (0,) + key
+		key = key + (slice(None),)*(2 - len(key))
+		zs = numpy.arange(len(self.zsteps) if self.volume else 1)[key[0]]
+		ys = numpy.arange(len(self.ysteps))[key[1]]
+		rows = numpy.atleast_1d(ys)
+		planes = []
+		for z in numpy.atleast_1d(zs):
+			blocks = []
+			start = 0
+			#consecutive selected lines from the same chunk are read in one go
+			while start < len(rows):
+				chunk = rows[start] // self.chunkLines
+				end = start
+				while end < len(rows) and rows[end] // self.chunkLines == chunk:
+					end += 1
+				blocks.append(numpy.array(self.chunk(z, chunk)[(rows[start:end] - chunk*self.chunkLines,) + key[2:]]))
+				start = end
+			if not blocks:
+				blocks.append(numpy.array(self.chunk(z, 0)[(rows,) + key[2:]]))
+			planes.append(numpy.concatenate(blocks))
+		result = numpy.array(planes)
+		if numpy.ndim(ys) == 0:
+			result = result[:, 0]
+		if numpy.ndim(zs) == 0:
+			result = result[0]
+		return result
+
+	def read(self):
+		return self[:]
+
+	#per line timestamps in s since the start of the scan as (z, y, t) rows
+	def lineTimes(self):
+		return numpy.array(self.meta["timing"]["lines"]).reshape(-1, 3)
@@ -13,7 +13,6 @@ import sys
 from functools import partial
 import Events
 import time
-from qupsi import *
 
 class ScanGui:
 	def __init__(self):
@@ -165,18 +164,9 @@ class ScanGui:
 		self.mainloop["checkForMax"] = (partial(self.gs.checkForMax, self.correctionSigToBack), True, 10)
 	
 	def reconnectQuTau(self):
-		#accept any device
-		TDC_init(-1)
-		#enable all channels
-		TDC_enableChannels(0xff)
-		#enable hbt
-		TDC_enableHbt(True)
-		#enable start stop
-		TDC_enableStartStop(True)
 		#exposure time in ms
 		self.gs.exposureTime = 1
-		TDC_setExposureTime(self.gs.exposureTime)
-		TDC_clearAllHistograms()
+		self.gs.reconnect("initTdc")
 	
 	def createCanvas(self, figure, master):
 		from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
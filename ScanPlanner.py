@@ -0,0 +1,257 @@
+import json
+import os.path
+import re
+import sys
+import numpy
+import ScanSettings
+
+#dry run of scans: estimated duration, memory and disk footprint of a config or a hook without touching the
+#hardware (so Scanner is not imported). The overheads per pixel and line come from the timing profile the
+#scanner writes after every scan if its timingProfile is set (Scanner.saveTimingProfile), without one rough
+#guesses are used
+#usage: python ScanPlanner.py <config or hook> [timing profile] [base config] [--headless]
+
+#defaults of the scanner settings the estimates depend on (the same as the ones of Scanner)
+defaults = dict(ScanSettings.defaults)
+defaults["lens"] = {"NA" : ScanSettings.lens[0], "n" : ScanSettings.lens[1]}
+#headless scans (scanrun) draw nothing
+defaults["headless"] = False
+
+#overheads in s until a scan measured them
+defaultProfile = {
+	"pixelOverhead" : 0.002,
+	"lineOverhead" : 0.01,
+	"render" : 0.02,
+	"quadtreeCoverage" : 1.0
+}
+
+#same as scannerObjects, but the sample size stays a dict
+def plannerObjects(dct):
+	if "_eval_" in dct:
+		if "libraries" in dct:
+			for lib in dct["libraries"]:
+				exec("import " + str(lib))
+		return eval(dct["expression"])
+	return dct
+
+#settings of a config file, with imports the imported configs come first (like Scanner.__init__,
+#Scanner.loadConfig ignores the imports)
+def readSettings(configFile, imports=True):
+	config = json.loads(open(configFile.strip()).read(), object_hook=plannerObjects)
+	settings = {}
+	if imports:
+		for cfgfile in config.get("imports", []):
+			settings.update(readSettings(cfgfile, False))
+	settings.update(config.get("settings", {}))
+	return settings
+
+def readProfile(profileFile):
+	profile = dict(defaultProfile)
+	if profileFile is not None and os.path.isfile(profileFile):
+		profile.update(json.loads(open(profileFile).read()))
+	return profile
+
+#galvo voltages of sample coordinates in mm (Scanner.voltagePhi)
+def galvoVoltages(steps, settings):
+	lensNumber = 1/numpy.tan(numpy.arcsin(settings["lens"]["NA"]/settings["lens"]["n"]))
+	return settings["sensitivityDeg"] * (180./numpy.pi) * numpy.arctan(numpy.asarray(steps, dtype=numpy.float64) * lensNumber)
+
+def settlingTime(step, settings):
+	return numpy.minimum(settings["settlingBase"] + settings["settlingPerVolt"] * numpy.abs(step), settings["settlingMax"])
+
+def piezoSettlingTime(step, settings):
+	step = numpy.abs(step)
+	return numpy.where(step > 0, numpy.minimum(settings["piezoSettlingBase"] + settings["piezoSettlingPerVolt"] * step, settings["piezoSettlingMax"]), 0.0)
+
+#seconds a volume scan waits for the piezo: volumeOrder "plane" changes the focus once per plane, "line"
+#goes through all planes on every line and jumps back to the first one
+def focusDuration(settings):
+	zsteps = numpy.asarray(settings["zsteps"], dtype=numpy.float64)
+	seconds = numpy.sum(piezoSettlingTime(numpy.diff(zsteps), settings))
+	if settings["volumeOrder"] == "line":
+		seconds = len(settings["ysteps"]) * (seconds + piezoSettlingTime(zsteps[-1] - zsteps[0], settings))
+	return float(seconds)
+
+#dwell of a pixel in s and whether it is only an upper bound
+def pixelDwell(settings, profile):
+	if settings["scanMode"] == "waveform":
+		dwell = settings["exposureTime"]
+		if settings["acquisition"] == "timestamps" and settings["pixelDwell"] is not None:
+			dwell = settings["pixelDwell"]
+		samples = max(int(round(dwell/1000. * settings["sampleRate"])), 1)
+		return samples / settings["sampleRate"], False
+	#the counting starts with the first counter frame after the galvos settled (see Scanner.settle), that is
+	#half an exposure later on average
+	start = 0.5*settings["exposureTime"]/1000.
+	if settings["adaptiveDwell"]:
+		if "meanDwell" in profile:
+			return start + profile["meanDwell"]/1000., False
+		return start + settings["maxDwell"]/1000., True
+	return start + settings["exposureTime"]/1000., False
+
+#duration in s of one line of the grid
+def lineDuration(settings, profile):
+	xVoltages = galvoVoltages(settings["xsteps"], settings)
+	yVoltages = galvoVoltages(settings["ysteps"], settings)
+	dwell, bound = pixelDwell(settings, profile)
+	#going back to the start of the line, in bidirectional mode only the step to the next line
+	flyback = abs(xVoltages[-1] - xVoltages[0]) if not settings["bidirectional"] else 0.0
+	flyback = max(flyback, numpy.max(numpy.abs(numpy.diff(yVoltages))) if len(yVoltages) > 1 else 0.0)
+	if settings["scanMode"] == "waveform":
+		return len(xVoltages)*dwell + profile["lineOverhead"] + settlingTime(flyback, settings), bound
+	steps = numpy.abs(numpy.diff(xVoltages))
+	return len(xVoltages)*(dwell + profile["pixelOverhead"]) + numpy.sum(settlingTime(steps, settings)) + settlingTime(flyback, settings), bound
+
+def npyBytes(shape, itemsize=8):
+	return 128 + int(numpy.prod(shape))*itemsize
+
+#estimate for one scan function of the scanner (scanSample, scanVolume, scanQuadtree, scanRegions, scanPattern) with settings,
+#returns a dict with seconds, pixels, memory (bytes held in ram), disk (bytes written while scanning) and bound
+#(True if the time is an upper bound only)
+def planScan(function, settings, profile, args=None):
+	if function == "scanRegions":
+		plan = {"seconds" : 0.0, "pixels" : 0, "memory" : 0, "disk" : 0, "bound" : False}
+		for region in args or []:
+			regionSettings = dict(settings)
+			regionSettings.update(readSettings(region, False))
+			step = planScan("scanSample", regionSettings, profile)
+			plan["seconds"] += step["seconds"]
+			plan["pixels"] += step["pixels"]
+			plan["memory"] = max(plan["memory"], step["memory"])
+			plan["disk"] += step["disk"]
+			plan["bound"] = plan["bound"] or step["bound"]
+		return plan
+	if function == "scanPattern":
+		from Trajectories import patterns
+		points = len(patterns[args[0]](*[float(arg) for arg in args[1:]])[0])
+		settings = dict(settings)
+		settings["scanMode"] = "waveform"
+		dwell, bound = pixelDwell(settings, profile)
+		chunks = -(-points // settings["trajectoryChunk"])
+		return {"seconds" : points*dwell + chunks*profile["lineOverhead"], "pixels" : points, "memory" : npyBytes((points, 4)), "disk" : 0, "bound" : bound}
+	nx = len(settings["xsteps"])
+	ny = len(settings["ysteps"])
+	planes = len(settings["zsteps"]) if function == "scanVolume" else 1
+	line, bound = lineDuration(settings, profile)
+	seconds = line * ny * planes
+	if function == "scanVolume":
+		seconds += focusDuration(settings)
+	if function == "scanQuadtree":
+		#only the refined part of the grid is measured
+		seconds *= profile["quadtreeCoverage"]
+	#the renderer draws frameRate times per second on the same interpreter
+	if not settings["headless"]:
+		seconds *= 1 + settings["frameRate"] * profile["render"]
+	arrays = [(planes, ny, nx, 8)]
+	if settings["adaptiveDwell"]:
+		arrays += [(1, ny, nx, 8)]
+	if settings["channelMaps"]:
+		#volume scans keep the counters of every plane
+		arrays += [(planes, ny, nx, 19*4)]
+	sizes = [npyBytes((z, y, x), itemsize) for z, y, x, itemsize in arrays]
+	disk = 0
+	memory = sum(sizes)
+	if settings["memmapFile"] is not None:
+		#paged by the os, only the disk counts
+		disk += memory
+		memory = 0
+	if settings["scanFile"] is not None:
+		#counts and timing of every line in meta.json
+		disk += sizes[0] + 40*ny*planes
+		if settings["channelMaps"]:
+			disk += sizes[-1]
+	if settings["checkpointFile"] is not None and settings["memmapFile"] is None:
+		disk += sizes[0]
+	return {"seconds" : seconds, "pixels" : nx*ny*planes, "memory" : memory, "disk" : disk, "bound" : bound}
+
+#bytes written by the save functions of a hook with the current settings
+def saveBytes(function, settings, volume):
+	n = len(settings["xsteps"]) * len(settings["ysteps"])
+	if function == "saveState":
+		#the csv has one "%.18e," (25 characters) per value
+		size = npyBytes((n,)) + 25*n
+		if settings["adaptiveDwell"]:
+			size += npyBytes((n,))
+		if settings["channelMaps"]:
+			size += npyBytes((n, 19), 4)
+		return size
+	if function == "saveVolume":
+		if settings["channelMaps"]:
+			return npyBytes((volume,)) + npyBytes((volume, 19), 4)
+		return npyBytes((volume,))
+	if function == "saveScanFile":
+		return npyBytes((n,)) + 40*len(settings["ysteps"])
+	return 0
+
+#walk through a hook like Scanner.parseHook does and plan every scan in it, settings are the settings of the
+#scanner when the hook starts (usually its config file). Returns the list of (function, plan) and the total
+def planHook(hookFile, settings, profile):
+	functionCallPattern = re.compile("\w+\s*\([\s\w\/\,\.\_\-\!\$\?]*\)")
+	settings = dict(settings)
+	steps = []
+	total = {"seconds" : 0.0, "pixels" : 0, "memory" : 0, "disk" : 0, "bound" : False}
+	memory = {}
+	volume = 0
+	for line in open(hookFile).readlines():
+		match = functionCallPattern.search(line)
+		if match is None:
+			continue
+		index = match.group().find("(")
+		functionName = match.group()[:index].strip()
+		arguments = match.group()[index+1:-1]
+		args = [a.strip() for a in arguments.split(",")] if arguments.strip() != "" else []
+		if functionName == "loadConfig" and len(args) > 0:
+			settings.update(readSettings(args[0], False))
+			continue
+		if functionName in ("scanSample", "scanVolume", "scanQuadtree", "scanRegions", "scanPattern"):
+			plan = planScan(functionName, settings, profile, args)
+			if functionName == "scanVolume":
+				volume = plan["pixels"]
+			#arrays of the scans stay alive until they are replaced by the next one of the same kind
+			memory[{"scanVolume" : "volume", "scanPattern" : "trajectory"}.get(functionName, "map")] = plan["memory"]
+			plan["memory"] = sum(memory.values())
+		elif functionName in ("saveState", "saveVolume", "saveScanFile"):
+			plan = {"seconds" : 0.0, "pixels" : 0, "memory" : sum(memory.values()), "disk" : saveBytes(functionName, settings, volume), "bound" : False}
+		else:
+			continue
+		steps += [(functionName, plan)]
+		total["seconds"] += plan["seconds"]
+		total["pixels"] += plan["pixels"]
+		total["memory"] = max(total["memory"], plan["memory"])
+		total["disk"] += plan["disk"]
+		total["bound"] = total["bound"] or plan["bound"]
+	return steps, total
+
+def formatBytes(size):
+	for unit in ("B", "kB", "MB", "GB"):
+		if size < 1024 or unit == "GB":
+			return "%.1f %s"%(size, unit)
+		size /= 1024.
+
+def formatTime(seconds):
+	hours, rest = divmod(int(round(seconds)), 3600)
+	minutes, seconds = divmod(rest, 60)
+	return "%d:%02d:%02d"%(hours, minutes, seconds)
+
+def report(steps, total):
+	for function, plan in steps:
+		print("%-14s %10s %12d px   ram %10s   disk %10s"%(function, formatTime(plan["seconds"]), plan["pixels"], formatBytes(plan["memory"]), formatBytes(plan["disk"])))
+	print("%-14s %10s %12d px   ram %10s   disk %10s%s"%("total", formatTime(total["seconds"]), total["pixels"], formatBytes(total["memory"]), formatBytes(total["disk"]), "   (upper bound, no adaptive dwell measured yet)" if total["bound"] else ""))
+
+if __name__ == "__main__":
+	argv = [arg for arg in sys.argv if arg != "--headless"]
+	if len(argv) < 2:
+		print("usage: python ScanPlanner.py <config or hook> [timing profile] [base config] [--headless]")
+		sys.exit(1)
+	profile = readProfile(argv[2] if len(argv) > 2 else "timing_profile.json")
+	settings = dict(defaults)
+	settings.update(readSettings(argv[3] if len(argv) > 3 else "scanner_config.cfg"))
+	settings["headless"] = settings["headless"] or len(argv) < len(sys.argv)
+	if argv[1].endswith(".hk"):
+		steps, total = planHook(argv[1], settings, profile)
+	else:
+		#a config file is planned as scanSample with its settings (and imports)
+		settings.update(readSettings(argv[1]))
+		plan = planScan("scanSample", settings, profile)
+		steps, total = [("scanSample", plan)], plan
+	report(steps, total)
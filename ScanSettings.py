@@ -0,0 +1,60 @@
+import numpy
+
+#defaults of the scan settings: every Scanner starts with them (configs and hooks override them) and ScanPlanner
+#plans with the same values. No hardware module is imported here
+
+#numerical aperture and refractive index of the default lens (Scanner.Lens)
+lens = (1.3, 1.5)
+
+defaults = {
+	#exposure time in ms (one counter frame of the tdc)
+	"exposureTime" : 1,
+	#"point" visits every pixel with setPoint, "waveform" streams each line as one buffered ao waveform
+	"scanMode" : "point",
+	#scan every second line backwards (see linePhase)
+	"bidirectional" : False,
+	#"counters" polls the coincidence counters, "timestamps" bins the photon timestamps along the trajectory
+	#(waveform mode only). pixelDwell in ms (None: exposure time)
+	"acquisition" : "counters",
+	"pixelDwell" : None,
+	#adaptive dwell (point mode): integrate every pixel at least minDwell and at most maxDwell (ms)
+	"adaptiveDwell" : False,
+	"minDwell" : 2,
+	"maxDwell" : 50,
+	#galvo settling: after a step of U volts (larger axis) we wait settlingBase + settlingPerVolt*U seconds
+	#(at most settlingMax), calibrateSettling measures both and stores them in the config
+	"settlingBase" : 0.0002,
+	"settlingPerVolt" : 0.002,
+	"settlingMax" : 0.05,
+	#the same for the piezo after a focus change (setFocus), it is much slower than the galvos
+	"piezoSettlingBase" : 0.005,
+	"piezoSettlingPerVolt" : 0.01,
+	"piezoSettlingMax" : 0.1,
+	#rate of the ao sample clock in Hz (used for the per point writes and the hardware timed raster)
+	"sampleRate" : 10000.0,
+	#redraws per second of the live scan image
+	"frameRate" : 10.0,
+	#sensitivity of the galvo in volt per degree and the voltages of the optical axis
+	"sensitivityDeg" : 0.5,
+	"calibrationPhi" : 0,
+	"calibrationTheta" : 0,
+	#the grid of scanSample (mm) and the focus values of the planes of scanVolume
+	"xsteps" : numpy.linspace(0, 0.05, 500),
+	"ysteps" : numpy.linspace(0, 0.05, 500),
+	"zsteps" : [0],
+	#scanVolume: "plane" or "line" (interleaved) order
+	"volumeOrder" : "plane",
+	#keep all counters of every pixel (channelArray)
+	"channelMaps" : False,
+	#back the scan arrays with memory mapped .npy files <memmapFile><suffix>.npy (None: in memory)
+	"memmapFile" : None,
+	#stream every line into the chunked container scanFile (directory, None: off), see ScanFile.py
+	"scanFile" : None,
+	#every checkpointInterval lines the scan and its settings are written to <checkpointFile>.npy/.json (None: off)
+	"checkpointFile" : None,
+	"checkpointInterval" : 10,
+	#scanTrajectory: points per buffered waveform (the interrupt is checked in between)
+	"trajectoryChunk" : 1000,
+	#the measured overheads are merged into this json file after every scan, ScanPlanner reads it (None: off)
+	"timingProfile" : None,
+}
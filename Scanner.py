@@ -1,10 +1,11 @@
-﻿from PyDAQmx import *
+﻿from Daq import *
 import numpy
-import matplotlib.pyplot as plt
 import random
 import time	
-from pyflycam import *
-from qupsi import *
+from Camera import openCamera
+from ctypes import *
+from Tdc import *
+import ScanSettings
 
 #################################################################################
 
@@ -19,6 +20,28 @@ class CallableList(list):
 			entry()
 	
 
+#attribute of the scanner for a device (tdc, daq and its tasks, camera) which the scanner method init connects.
+#The first use waits for init: in the background if startDevices started it already, otherwise it runs right then
+class Device:
+	def __init__(self, init):
+		self.init = init
+	
+	def __set_name__(self, owner, name):
+		self.name = name
+	
+	def __get__(self, scanner, owner):
+		if scanner is None:
+			return self
+		if self.init not in scanner._ready:
+			scanner.waitDevice(self.init)
+		try:
+			return scanner._devices[self.name]
+		except KeyError:
+			raise AttributeError(self.name)
+	
+	def __set__(self, scanner, value):
+		scanner._devices[self.name] = value
+
 #helper class for Sample size
 class Size:
 	def __init__(self, height, width):
@@ -37,14 +60,54 @@ class Size:
 		self.height /=other
 		return self
 	
+#helper class for measuring how often and how long an operation takes, use it in a with statement
+class TimingCounter:
+	def __init__(self):
+		self.reset()
+	
+	def reset(self):
+		self.count = 0
+		self.total = 0.0
+		self.last = 0.0
+		self.max = 0.0
+	
+	def __enter__(self):
+		self._start = time.perf_counter()
+		return self
+	
+	def __exit__(self, *args):
+		self.add(time.perf_counter() - self._start)
+		return False
+	
+	#add a duration (s) which was measured somewhere else
+	def add(self, duration):
+		self.last = duration
+		self.count += 1
+		self.total += duration
+		self.max = max(self.max, duration)
+	
+	#mean duration in seconds
+	def mean(self):
+		return self.total / self.count if self.count > 0 else 0.0
+	
+	def asDict(self):
+		return {"count" : self.count, "total" : self.total, "mean" : self.mean(), "max" : self.max}
+	
+	def __repr__(self):
+		return "%d calls, mean %.3f ms, max %.3f ms"%(self.count, self.mean()*1000, self.max*1000)
+
 #Helper class for storing Lens informatios and to calculate the focal length corresponding to the NA
 class Lens:
 	def __init__(self, NA, n):
 		self.NA = NA
 		self.n = n
+		self._lensNumber = None
 	
+	#cached, only recalculated if NA or n changed
 	def LensNumber(self):
-		return 1/numpy.tan(numpy.arcsin(self.NA/self.n))
+		if self._lensNumber is None or self._lensNumber[0] != (self.NA, self.n):
+			self._lensNumber = ((self.NA, self.n), 1/numpy.tan(numpy.arcsin(self.NA/self.n)))
+		return self._lensNumber[1]
 #########################################################################################
 
 ################################################################
@@ -68,18 +131,139 @@ def scannerObjects(dct):
 		return eval(dct["expression"])
 	return dct
 
+#shift a line by a (sub pixel) number of pixels: result[k] = line[k + shift], the edges are held
+def shiftLine(line, shift):
+	index = numpy.arange(len(line), dtype=numpy.float64)
+	return numpy.interp(index + shift, index, line)
+
+#estimate the offset (in pixels) of a backward line against a forward line, such that
+#shiftLine(reverse, offset) matches forward. Returns None if there is no structure to correlate: the peak of
+#the normalised correlation has to reach minCorrelation, lines of background only correlate by chance
+def estimateLinePhase(forward, reverse, maxShift=None, minCorrelation=0.5):
+	#lost pixels (NaN) do not correlate with anything
+	forward = numpy.nan_to_num(numpy.asarray(forward, dtype=numpy.float64) - numpy.nanmean(forward))
+	reverse = numpy.nan_to_num(numpy.asarray(reverse, dtype=numpy.float64) - numpy.nanmean(reverse))
+	if not numpy.any(forward) or not numpy.any(reverse):
+		return None
+	n = len(forward)
+	if maxShift is None:
+		maxShift = max(n // 8, 1)
+	corr = numpy.correlate(reverse, forward, 'full')
+	lags = numpy.arange(-(n-1), n)
+	window = numpy.abs(lags) <= maxShift
+	corr = corr[window]
+	lags = lags[window]
+	k = numpy.argmax(corr)
+	if corr[k] < minCorrelation * numpy.sqrt(numpy.sum(forward*forward) * numpy.sum(reverse*reverse)):
+		return None
+	shift = float(lags[k])
+	#refine with a parabola through the peak and its neighbours
+	if 0 < k < len(corr)-1:
+		denom = corr[k-1] - 2*corr[k] + corr[k+1]
+		if denom != 0:
+			shift += 0.5 * (corr[k-1] - corr[k+1]) / denom
+	return shift
+
+#count the photons per pixel of a line: the first event on markerChannel is the start of the line,
+#every pixel lasts pixelDwell seconds, timestamps are in units of timebase (seconds)
+#returns None if the marker is missing
+def binTimestamps(timestamps, channels, markerChannel, photonChannels, timebase, pixelDwell, npixels):
+	starts = timestamps[channels == markerChannel]
+	if len(starts) == 0:
+		return None
+	photons = timestamps[numpy.isin(channels, photonChannels)]
+	pixel = numpy.floor((photons - starts[0]) * (timebase / pixelDwell)).astype(numpy.int64)
+	pixel = pixel[(pixel >= 0) & (pixel < npixels)]
+	return numpy.bincount(pixel, minlength=npixels).astype(numpy.float64)
+
+#decide if a pixel which collected counts in dwell seconds is finished: the relative poisson error reached
+#targetError, maxDwell is over or after minDwell it is not significantly brighter than the background
+def dwellFinished(counts, dwell, targetError, minDwell, maxDwell, backgroundRate=None):
+	if dwell >= maxDwell:
+		return True
+	if dwell < minDwell:
+		return False
+	if counts > 0 and 1.0/numpy.sqrt(counts) <= targetError:
+		return True
+	if backgroundRate is not None:
+		expected = backgroundRate * dwell
+		if counts <= expected + 3*numpy.sqrt(expected):
+			return True
+	return False
+
+#parse a config file (without applying it to a scanner)
+def readConfig(configFile):
+	import json
+	import os.path
+	if not os.path.isfile(configFile):
+		raise(ConfigFileNotFoundException)
+	return json.loads(open(configFile).read(), object_hook=scannerObjects)
+
+#order scan regions (see Scanner.regionSpec) greedily such that the galvo and the piezo travel as little as
+#possible, starting from start = (x, y, focus). focusWeight converts piezo volts into mm of galvo travel
+def orderRegions(regions, start, focusWeight=1.0):
+	remaining = list(regions)
+	ordered = []
+	x, y, focus = start
+	while len(remaining) > 0:
+		def cost(region):
+			ex, ey = region["entry"]
+			dz = abs(region["focus"] - focus) if region["focus"] is not None and focus is not None else 0.0
+			return numpy.hypot(ex - x, ey - y) + focusWeight*dz
+		best = min(remaining, key=cost)
+		remaining.remove(best)
+		ordered += [best]
+		x, y = best["exit"]
+		if best["focus"] is not None:
+			focus = best["focus"]
+	return ordered
+
 class Scanner:
 	#scanner class: needs sampleSize (to calculate the max and min angles for the galvo) and 
 	#               the distance from the galvo to the lens
 	
 	#sensitivity of the galvo in volt per rad
 	sensitivityRad = 90.0/numpy.pi
-	sensitivityDeg = 0.5
+	#results of the scans, not part of the settings written to the scan files
+	scanDataAttributes = ("dataArray", "volumeArray", "dwellArray", "channelArray", "volumeChannelArray", "trajectoryData", "histoData", "testData", "regionData", "lineEstimates")
+	#hardware, connected on first use (see Device)
+	tdc = Device("initTdc")
+	daq = Device("initDaq")
+	analog_output = Device("initDaq")
+	analog_input = Device("initDaq")
+	camera = Device("initCamera")
+	#settings written to the scan checkpoints (everything needed to continue the scan)
+	checkpointSettings = ["xsteps", "ysteps", "zsteps", "focus", "exposureTime", "scanMode", "bidirectional", "linePhase", "acquisition", "pixelDwell", "adaptiveDwell", "targetError", "minDwell", "maxDwell", "backgroundRate", "volumeOrder", "memmapFile", "channelMaps", "scanFile", "scanFileChunkLines"]
 	
 	# arguments: all units in mm, devicePhi for Xtranslation, devicetheta for Ytranslation
-	def __init__(self, sampleSize = None,beamDiameter = 5, lens = Lens(1.3,1.5),inputDevice="Dev2/ai1", devicePhi = "Dev2/ao1", deviceTheta = "Dev2/ao0", configFile = "scanner_config.cfg"):
+	def __init__(self, sampleSize = None,beamDiameter = 5, lens = Lens(*ScanSettings.lens),inputDevice="Dev2/ai1", devicePhi = "Dev2/ao1", deviceTheta = "Dev2/ao0", configFile = "scanner_config.cfg", camera=True, headless=False, tdc="qutau", daq="nidaq", cameraDevice="flycapture", preload=True):
+		import threading
+		#the devices, the inits which are done and the running ones (see Device)
+		self._devices = {}
+		self._ready = set()
+		self._starting = {}
+		self._initThreads = {}
+		self._deviceLock = threading.Lock()
+		#seconds every init took (startup of the gui and of batch runs)
+		self.initTiming = {}
+		#the scan settings start with the defaults (ScanSettings.py), copies so the arrays are not shared
+		import copy
+		for key, value in ScanSettings.defaults.items():
+			setattr(self, key, copy.deepcopy(value))
 		#local variables rerpresenting the sate of the scanner
 		self.testData = []
+		#sample buffer for the single point writes (phi, theta, piezo grouped by channel)
+		self._positionBuffer = numpy.zeros((3,100), dtype=numpy.float64)
+		self._pointBuffer = numpy.zeros((3,), dtype=numpy.float64)
+		#counter buffer of settle
+		self._frameBuffer = (c_int*TDC_COINC_CHANNELS)()
+		#keep the ao task running in on demand mode and only push new values (instead of start/stop per move)
+		self.persistentOutput = True
+		#time spent in the ao writes of the single point moves
+		self.aoTiming = TimingCounter()
+		#time a pixel (point mode) or a line (waveform mode) takes on top of its dwell and the settling
+		self.pixelTiming = TimingCounter()
+		self.lineTiming = TimingCounter()
 		self.currentX = 0
 		self.currentY = 0
 		self.currentVoltagePhi = 0
@@ -89,35 +273,73 @@ class Scanner:
 		self.currentGalvoPhi = 0
 		self.currentGalvoTheta = 0
 		self.lens = lens
-		self.calibrationPhi = 0
-		self.calibrationTheta = 0
 		self.devicePhi = devicePhi
 		self.deviceTheta = deviceTheta
 		self.inputDevice = inputDevice
 		self.autoscale = True
 		self.hbtLoop = False
+		#last g2 of showHBT, saveState stores it
+		self.histoData = None
 		self.baseVoltage = 5
 		self.currentXCoord = 0
 		self.currentYCoord = 0
 		self.sigToBack = 0.5
+		self.signalCorrection = False
 		self.doNormalization = False
 		self.autocorrection = False
 		self.quadSize = 3
 		self.noCheckForMax = True
 		self.startPoint = None
 		self.correctionFactor = (0,0)
-		#accept any device
-		TDC_init(-1)
-		#enable all channels
-		TDC_enableChannels(0xff)
-		#enable hbt
-		TDC_enableHbt(True)
-		#enable start stop
-		TDC_enableStartStop(True)
-		#exposure time in ms
-		self.exposureTime = 1
-		TDC_setExposureTime(self.exposureTime)
-		TDC_clearAllHistograms()
+		#offset of the backward lines of bidirectional scans in pixels or "auto" (estimated from the line pairs
+		#which correlate at least with linePhaseCorrelation, see estimateLinePhase)
+		self.linePhase = 0.0
+		self.linePhaseCorrelation = 0.5
+		self.lineEstimates = []
+		#timestamp acquisition: the ao start trigger is exported to lineTriggerOutput which has to be wired to the
+		#tdc input markerChannel
+		self.lineTriggerOutput = "/Dev1/PFI0"
+		self.markerChannel = 7
+		self.photonChannels = None
+		self.timestampBufferSize = 1000000
+		#adaptive dwell (point mode): integrate every pixel until the relative poisson error is below targetError,
+		#at least minDwell and at most maxDwell (ms). After minDwell pixels which are consistent with backgroundRate
+		#(counts/s, "auto": median of the previous line, None: off) are finished early
+		self.targetError = 0.1
+		self.backgroundRate = "auto"
+		self.dwellArray = None
+		#coarse to fine scanning (scanQuadtree): coarse step in pixels (power of two) and refinement criteria
+		self.quadtreeStep = 8
+		self.quadtreeThreshold = "auto"
+		self.quadtreeGradient = "auto"
+		self.quadtreeSigma = 5
+		#scanRegions: mm of galvo travel one volt of piezo travel is worth when ordering the regions
+		self.focusTravelWeight = 1.0
+		self.trajectoryData = None
+		#headless: no figures and no live view (batch runs, see scanrun.py), useCamera: init the camera at start
+		#(takePicture initialises it on demand otherwise), preload: connect the tdc and the daq (and the camera)
+		#in the background right after the config is read instead of on first use
+		self.headless = headless
+		self.useCamera = camera
+		self.preload = preload
+		#checkpoints: an interrupted scan is continued with resumeScan. With memmapFile other processes can
+		#read the arrays with numpy.load(..., mmap_mode='r') during the scan. The scanFile of scanSample/scanVolume
+		#holds the axes, all settings and the timing too
+		self.scanFileChunkLines = 16
+		self.scanWriter = None
+		self.channelWriter = None
+		#channelMaps: all TDC_COINC_CHANNELS counters of every pixel of a grid scan as counts in channelArray (y, x, counter)
+		#instead of only their summed rate (counter acquisition only), channelMap derives maps from it
+		self.channelArray = None
+		#the counters of a volume scan (z, y, x, counter), channelArray is a view of its plane while scanning
+		self.volumeChannelArray = None
+		#volts of the last galvo step (settle)
+		self.lastStep = 0.0
+		self.configFile = configFile
+		#tdc: "qutau", "simulated" (photons of a synthetic sample, see Tdc.py) or a tdc object
+		#daq: "nidaq", "simulated" (records the waveforms and models the galvos, see Daq.py) or a daq object
+		#camera: "flycapture", "simulated" (renders the laser spot, see Camera.py) or a camera object
+		self._deviceTypes = {"tdc" : tdc, "daq" : daq, "camera" : cameraDevice}
 		#the calibration values, read them from the config file
 		import json
 		import os.path
@@ -142,69 +364,158 @@ class Scanner:
 		self.maxY = self.sampleSize.height / 2.0
 		self.minY = -self.sampleSize.height / 2.0
 		
-		if not hasattr(self, 'xsteps'):
-			self.xsteps = numpy.linspace(0, 0.05, 500)
-		if not hasattr(self, 'ysteps'):
-			self.ysteps = numpy.linspace(0,0.05, 500)
 
-		self.dataArray = numpy.ones((len(self.ysteps),len(self.xsteps)), dtype=numpy.float64)
+		self.dataArray = self.allocateArray((len(self.ysteps),len(self.xsteps)))
+		self.voltageTables()
 		
+		#the devices do not depend on each other, so they connect at the same time
+		if self.preload:
+			self.startDevices(["initTdc", "initDaq"] + (["initCamera"] if self.useCamera else []))
+	
+	#connect the devices of the inits in the background, each in its own thread
+	def startDevices(self, inits):
+		import concurrent.futures
+		import threading
+		with self._deviceLock:
+			inits = [init for init in inits if init not in self._starting]
+			for init in inits:
+				self._starting[init] = concurrent.futures.Future()
+		for init in inits:
+			thread = threading.Thread(target=self.runDevice, args=(init,), name=init)
+			thread.daemon = True
+			thread.start()
+	
+	def runDevice(self, init):
+		import threading
+		future = self._starting[init]
+		self._initThreads[init] = threading.current_thread()
+		try:
+			start = time.perf_counter()
+			getattr(self, init)()
+			self.initTiming[init] = time.perf_counter() - start
+		except Exception as error:
+			future.set_exception(error)
+		else:
+			self._ready.add(init)
+			future.set_result(None)
+	
+	#wait until init is done (start it in this thread if nobody did), the init itself gets the devices right away
+	def waitDevice(self, init):
+		import concurrent.futures
+		import threading
+		with self._deviceLock:
+			future = self._starting.get(init)
+			if future is None:
+				future = self._starting[init] = concurrent.futures.Future()
+				run = True
+			else:
+				run = False
+		if run:
+			self.runDevice(init)
+		elif self._initThreads.get(init) is threading.current_thread():
+			return
+		future.result()
+	
+	#run init again (e.g. the device was unplugged): a running init is waited for first, the devices are
+	#accessed through Device in between, so they wait for the new init and nothing runs it twice
+	def reconnect(self, init):
+		future = self._starting.get(init)
+		if future is not None:
+			#the error of a failed init is the reason for the reconnect
+			future.exception()
+		with self._deviceLock:
+			if self._starting.get(init) is future:
+				self._starting.pop(init, None)
+				self._ready.discard(init)
+		self.waitDevice(init)
+	
+	#init was started (the device is connected or connects right now)
+	def deviceStarted(self, init):
+		return init in self._starting
+	
+	#wait for the devices the background started
+	def waitReady(self):
+		for init in list(self._starting):
+			self.waitDevice(init)
+	
+	#create the ao task (galvos and piezo) and the ai task (galvo position) and move the piezo to the focus
+	def initDaq(self):
+		daq = self._devices.get("daq")
+		if daq is None:
+			daq = openDaq(self._deviceTypes["daq"])
+			daq.attach(self)
+			self.daq = daq
 		#prepare the output channels
 		try:
-			self.analog_output = Task()
+			self.analog_output = self.daq.createTask()
 			self.analog_output.CreateAOVoltageChan(",".join([self.devicePhi, self.deviceTheta, self.piezoDevice]),"",-10.0,10.0,DAQmx_Val_Volts,None)
 			#self.analog_output.CreateAOVoltageChan(deviceTheta,"",-10.0,10.0,DAQmx_Val_Volts,None)
-			self.analog_output.CfgSampClkTiming("",10000.0,DAQmx_Val_Rising,DAQmx_Val_ContSamps,100)
+			self.analog_output.CfgSampClkTiming("",self.sampleRate,DAQmx_Val_Rising,DAQmx_Val_ContSamps,100)
+			self.restoreOutput()
 			
-			self.analog_input = Task()
+			self.analog_input = self.daq.createTask()
 			self.analog_input.CreateAIVoltageChan(self.inputDevice, "", DAQmx_Val_Cfg_Default, -10.0,10.0,DAQmx_Val_Volts, None)
 			self.analog_input.CfgSampClkTiming("",10000.0,DAQmx_Val_Rising,DAQmx_Val_ContSamps,100)	
 		except(Exception):
 			print("Could not init DaqMX")
-		self.initCamera()
-				#if we have a focus point set it
-		#init the piezo to full focal 
-		self.setFocus(0)
-		if hasattr(self, "focus"):
-			self.setFocus(self.focus)
-		if(hasattr(self, "imageSettings")):
-			self.setImageProperties(self.imageSettings['gain'], self.imageSettings['shutter'])	
-		time.sleep(2)
+		#init the piezo to the focus point if we have one (full focal otherwise)
+		self.setFocus(self.focus if hasattr(self, "focus") else 0)
 	
 	#load config file
 	def loadConfig(self, configFile="scanner_config.cfg", focus=None):
-		import json
-		import os.path
-		if os.path.isfile(configFile):
-			self._config = json.loads(open(configFile).read(), object_hook=scannerObjects)
-		else:
-			raise(ConfigFileNotFoundException)
+		self._config = readConfig(configFile)
 		if "settings" in  self._config:
 			for key in self._config["settings"]:
 				setattr(self, key, self._config["settings"][key])
-		if hasattr(self, "focus"):
+		#without a daq yet initDaq moves to the focus
+		if hasattr(self, "focus") and self.deviceStarted("initDaq"):
 			self.setFocus(self.focus)
 		if focus is not None:
 			print("set focus")
 			focus.set(self.focus)
-		self.dataArray = numpy.ones((len(self.ysteps),len(self.xsteps)), dtype=numpy.float64)
+		#drop the old map first, a mapped file can not be recreated while it is still open (windows)
+		self.dataArray = None
+		self.dataArray = self.allocateArray((len(self.ysteps),len(self.xsteps)))
+		self.voltageTables()
+	
+	#array for scan results initialised with ones, in memory or (memmapFile set) mapped to <memmapFile><suffix>.npy
+	def allocateArray(self, shape, suffix="", dtype=numpy.float64, fill=1):
+		if self.memmapFile is None:
+			return numpy.full(shape, fill, dtype=dtype)
+		from numpy.lib.format import open_memmap
+		data = open_memmap(self.memmapFile.strip()+suffix+".npy", mode="w+", dtype=dtype, shape=shape)
+		data[...] = fill
+		return data
 
 	#setImage properties
 	def setImageProperties(self, gain=0.0, shutter=10.0):
-		gainProp = fc2Property()
-		shutterProp = fc2Property()
-		gainProp.type = FC2_GAIN
-		shutterProp.type = FC2_SHUTTER
-		
-		#retrieve current settings
-		fc2GetProperty(self._context, gainProp)
-		fc2GetProperty(self._context, shutterProp)
-		
-		gainProp.absValue = gain
-		shutterProp.absValue = shutter
-		
-		fc2SetProperty(self._context, gainProp)
-		fc2SetProperty(self._context, shutterProp)
+		self.camera.setImageProperties(gain, shutter)
+	#(re)connect the tdc with all channels, hbt and start stop enabled
+	def initTdc(self):
+		tdc = self._devices.get("tdc")
+		if tdc is None:
+			tdc = openTdc(self._deviceTypes["tdc"])
+			tdc.attach(self)
+		#accept any device
+		tdc.init(-1)
+		#enable all channels
+		tdc.enableChannels(0xff)
+		#enable hbt
+		tdc.enableHbt(True)
+		#enable start stop
+		tdc.enableStartStop(True)
+		tdc.setExposureTime(self.exposureTime)
+		tdc.clearAllHistograms()
+		#ready as soon as the first counter update of the new exposure time is there (at most a second)
+		counters = (c_int*TDC_COINC_CHANNELS)()
+		updates = c_int()
+		deadline = time.perf_counter() + 1.0
+		tdc.getCoincCounters(counters, updates)
+		while updates.value == 0 and time.perf_counter() < deadline:
+			time.sleep(self.exposureTime/4000.0)
+			tdc.getCoincCounters(counters, updates)
+		self.tdc = tdc
+	
 	def startScanhook(self, hook):
 		getattr(self, hook)()
 	
@@ -216,12 +527,14 @@ class Scanner:
 		tmpX = self.currentX
 		max = oldMax
 		self.setX(tmpX + step)
-		TDC_getCoincCounters(tmpBuffer)
-		countsA = numpy.sum(tmpBuffer)/0.032
+		self.settle(True)
+		self.tdc.getCoincCounters(tmpBuffer)
+		countsA = numpy.sum(tmpBuffer)/(self.exposureTime/1000.)
 		#try to go a step back
 		self.setX(tmpX - step)
-		TDC_getCoincCounters(tmpBuffer)
-		countsB = numpy.sum(tmpBuffer)/0.032
+		self.settle(True)
+		self.tdc.getCoincCounters(tmpBuffer)
+		countsB = numpy.sum(tmpBuffer)/(self.exposureTime/1000.)
 		diff = countsA-countsB
 		print("diff is: ", diff)
 		if abs(diff) >  1.5 *numpy.sqrt(oldMax):
@@ -232,9 +545,9 @@ class Scanner:
 				self.setX(tmpX + step / 2.0)
 		else:
 			return oldMax
-		time.sleep(0.032)
-		TDC_getCoincCounters(tmpBuffer)
-		counts = numpy.sum(tmpBuffer)/0.032
+		self.settle(True)
+		self.tdc.getCoincCounters(tmpBuffer)
+		counts = numpy.sum(tmpBuffer)/(self.exposureTime/1000.)
 		max = self.findMaximumX(counts, step=step/2.0)
 		#we did not find any maximum go back to origin
 		tmpB = None
@@ -248,12 +561,14 @@ class Scanner:
 		tmpY = self.currentY
 		max = oldMax
 		self.setY(tmpY + step)
-		TDC_getCoincCounters(tmpBuffer)
-		countsA = numpy.sum(tmpBuffer)/0.032
+		self.settle(True)
+		self.tdc.getCoincCounters(tmpBuffer)
+		countsA = numpy.sum(tmpBuffer)/(self.exposureTime/1000.)
 		#try to go a step back
 		self.setY(tmpY - step)
-		TDC_getCoincCounters(tmpBuffer)
-		countsB = numpy.sum(tmpBuffer)/0.032
+		self.settle(True)
+		self.tdc.getCoincCounters(tmpBuffer)
+		countsB = numpy.sum(tmpBuffer)/(self.exposureTime/1000.)
 		diff = countsA-countsB
 		if abs(diff) > 1.5 *numpy.sqrt(oldMax):
 			#so go half the step size to the right
@@ -263,9 +578,9 @@ class Scanner:
 				self.setY(tmpY + step / 2.0)
 		else:
 			return oldMax
-		time.sleep(0.032)
-		TDC_getCoincCounters(tmpBuffer)
-		counts = numpy.sum(tmpBuffer)/0.032
+		self.settle(True)
+		self.tdc.getCoincCounters(tmpBuffer)
+		counts = numpy.sum(tmpBuffer)/(self.exposureTime/1000.)
 		max = self.findMaximumY(counts, step=step/2.0)
 		#we did not find any maximum go back to origin
 		tmpB = None
@@ -283,15 +598,15 @@ class Scanner:
 		#lets start finding the maximum
 		tmpB = c_int *19
 		tmpBuffer = tmpB()
-		TDC_getCoincCounters(tmpBuffer)
+		self.tdc.getCoincCounters(tmpBuffer)
 		counts = numpy.sum(tmpBuffer)
 		newmax = self.findMaximumX(counts)
 		newmax = self.findMaximumY(newmax)
 		tmpB = None
 		tmpBuffer = None
 
-	def callbackFactory(self, callback, args):
-		return lambda: getattr(self, callback.strip())(args)
+	def callbackFactory(self, callback, *args):
+		return lambda: getattr(self, callback.strip())(*args)
 	
 	def parseHook(self, hookFile):
 		keywords = { }
@@ -319,7 +634,7 @@ class Scanner:
 							args = arguments.split(",")
 						#print(arguments)
 						if args is not None:
-							if functionName == "plot3dmap":
+							if functionName in ("plot3dmap", "scanRegions", "calibrateSettling"):
 								body += [self.callbackFactory(functionName, args)]
 							else:
 								body += [self.callbackFactory(functionName, *args)]
@@ -341,10 +656,10 @@ class Scanner:
 				name, value = match.group().split("=")
 				setattr(tmpObject, name.strip(), value.strip())
 			
-			if hasattr(tmpObject, "name"):
-				tmpHookName = getattr(tmpObject, "name")
-			setattr(self, tmpHookName, body)
-			return tmpHookName
+		if hasattr(tmpObject, "name"):
+			tmpHookName = getattr(tmpObject, "name")
+		setattr(self, tmpHookName, body)
+		return tmpHookName
 	#get state of galvo -> return angle in degree
 	def getAnglePhiDegree(self):
 		return self.currentGalvoPhi * (180./numpy.pi)
@@ -396,66 +711,185 @@ class Scanner:
 	def setFocus(self, voltage):
 		if self.baseVoltage - voltage < 0:
 			raise(VoltageCannotBeNegativeException)
-		v = self.baseVoltage - voltage
-		data = numpy.zeros((300,), dtype=numpy.float64)
-		data[:100] = self.currentVoltagePhi
-		data[100:200] = self.currentVoltageTheta
-		data[200:] = v
+		step = abs(self.baseVoltage - voltage - self.currentPiezoVoltage)
+		self.writeVoltages(self.currentVoltagePhi, self.currentVoltageTheta, self.baseVoltage - voltage)
+		#the galvo settling of the next pixel does not cover the piezo, it is much slower
+		wait = self.piezoSettlingTime(step)
+		if wait > 0:
+			time.sleep(wait)
+	
+	#write all three channels (phi, theta, piezo) in one transaction, the sample buffer is reused for every move
+	def writeVoltages(self, phi, theta, piezo):
+		data = self._positionBuffer
+		data[0] = phi
+		data[1] = theta
+		data[2] = piezo
+		self._pointBuffer[:] = (phi, theta, piezo)
+		self.lastStep = max(abs(phi - self.currentVoltagePhi), abs(theta - self.currentVoltageTheta))
 		#set the state of the object
-		self.currentPiezoVoltage = v
+		self.currentVoltagePhi = phi
+		self.currentVoltageTheta = theta
+		self.currentPiezoVoltage = piezo
 		
 		#write to the output channel
-		self.analog_output.WriteAnalogF64(100,False,-1,DAQmx_Val_GroupByChannel ,data,None,None)
-		self.analog_output.StartTask()
-		
-		self.analog_output.StopTask()
-		
+		with self.aoTiming:
+			if self.persistentOutput:
+				#the task is already running, one sample per channel is updated immediately
+				self.analog_output.WriteAnalogF64(1,False,10.0,DAQmx_Val_GroupByChannel ,self._pointBuffer,None,None)
+			else:
+				self.analog_output.WriteAnalogF64(100,False,-1,DAQmx_Val_GroupByChannel ,data,None,None)
+				self.analog_output.StartTask()
+				
+				self.analog_output.StopTask()
+	
+	#seconds the galvos need to settle after a step of step volts
+	def settlingTime(self, step):
+		return min(self.settlingBase + self.settlingPerVolt * abs(step), self.settlingMax)
+	
+	#seconds the piezo (focus) needs to settle after a step of step volts, nothing if it did not move
+	def piezoSettlingTime(self, step):
+		if step == 0:
+			return 0.0
+		return min(self.piezoSettlingBase + self.piezoSettlingPerVolt * abs(step), self.piezoSettlingMax)
+	
+	#wait until the galvos settled after the last move, with frame also until the last finished counter frame
+	#was taken completely at the new position. The frames run freely, the next one to finish began before the
+	#galvos settled, so we wait for the one after it (between one and two exposures). Returns the seconds waited
+	def settle(self, frame=False):
+		start = time.perf_counter()
+		wait = self.settlingTime(self.lastStep)
+		if wait > 0:
+			time.sleep(wait)
+		if frame:
+			updates = c_int()
+			self.tdc.getCoincCounters(self._frameBuffer, updates)
+			frames = 0
+			deadline = time.perf_counter() + 3*self.exposureTime/1000. + 1.0
+			while frames < 2 and time.perf_counter() < deadline:
+				#polled without sleeping, a sleep can take much longer than a frame on windows
+				time.sleep(0)
+				self.tdc.getCoincCounters(self._frameBuffer, updates)
+				frames += updates.value
+		return time.perf_counter() - start
+	
+	#measure the settling of the phi galvo for steps of amplitudes volts, inputDevice
+	#has to be wired to the position output of the galvo. The time until the position stays within tolerance
+	#(fraction of the step) is fitted with settlingBase + settlingPerVolt*step and written to configFile
+	def calibrateSettling(self, amplitudes="0.02,0.05,0.1,0.2,0.5,1.0,2.0", tolerance=0.02, configFile=None):
+		import json
+		#a list from hooks
+		amplitudes = [float(a) for a in (amplitudes.split(",") if isinstance(amplitudes, str) else amplitudes)]
+		tolerance = float(tolerance)
+		rate = 10000.0
+		nsamples = int(0.1*rate)
+		data = numpy.zeros((nsamples,), dtype=numpy.float64)
+		read = int32()
+		phi, theta, piezo = self.currentVoltagePhi, self.currentVoltageTheta, self.currentPiezoVoltage
+		times = []
+		self.analog_input.StopTask()
+		self.analog_input.CfgSampClkTiming("",rate,DAQmx_Val_Rising,DAQmx_Val_FiniteSamps,nsamples)
+		for amplitude in amplitudes:
+			self.writeVoltages(phi, theta, piezo)
+			time.sleep(0.1)
+			self.analog_input.StartTask()
+			self.writeVoltages(phi + amplitude, theta, piezo)
+			self.analog_input.ReadAnalogF64(nsamples,1.0,DAQmx_Val_GroupByChannel,data,nsamples,byref(read),None)
+			self.analog_input.StopTask()
+			before = numpy.median(data[:5])
+			after = numpy.median(data[-nsamples//10:])
+			#last sample outside of the tolerance band around the final position
+			outside = numpy.nonzero(numpy.abs(data - after) > tolerance*abs(after - before))[0]
+			times += [(outside[-1]+1)/rate if len(outside) > 0 else 0.0]
+			print("step %f V settled after %f ms"%(amplitude, times[-1]*1000))
+		self.writeVoltages(phi, theta, piezo)
+		self.analog_input.CfgSampClkTiming("",rate,DAQmx_Val_Rising,DAQmx_Val_ContSamps,100)
+		perVolt, base = numpy.polyfit(amplitudes, times, 1)
+		self.settlingPerVolt = max(float(perVolt), 0.0)
+		self.settlingBase = max(float(base), 0.0)
+		print("settling: %f ms + %f ms/V"%(self.settlingBase*1000, self.settlingPerVolt*1000))
+		#store the model in the config, the file is read without evaluating the expressions in it
+		configFile = (configFile if configFile is not None else self.configFile).strip()
+		config = json.loads(open(configFile).read())
+		config.setdefault("settings", {})
+		config["settings"]["settlingBase"] = self.settlingBase
+		config["settings"]["settlingPerVolt"] = self.settlingPerVolt
+		open(configFile, "w").write(json.dumps(config, indent=1))
+		return self.settlingBase, self.settlingPerVolt
+	
+	#move galvo (and piezo if focus is given) to x, y in mm with a single write
+	def setPosition(self, x, y, focus=None):
+		piezo = self.currentPiezoVoltage
+		if focus is not None:
+			if self.baseVoltage - focus < 0:
+				raise(VoltageCannotBeNegativeException)
+			piezo = self.baseVoltage - focus
+		self.writeVoltages(float(self.voltagePhi(x)), float(self.voltageTheta(y)), piezo)
+		self.trackPosition(x, y)
+	
+	#move to pixel (ix, iy) of the scan grid, the voltages come from the precomputed tables
+	def setGridPoint(self, ix, iy):
+		xVoltages, yVoltages = self.voltageTables()
+		self.writeVoltages(xVoltages[ix], yVoltages[iy], self.currentPiezoVoltage)
+		self.trackPosition(self.xsteps[ix], self.ysteps[iy])
+	
+	#remember where the beam is (x, y in mm), the galvo angles follow from the voltages
+	def trackPosition(self, x, y):
+		self.currentX = x
+		self.currentY = y
+		self.currentGalvoPhi = (self.currentVoltagePhi - self.calibrationPhi) / self.sensitivityDeg
+		self.currentGalvoTheta = (self.currentVoltageTheta - self.calibrationTheta) / self.sensitivityDeg
+	
+	#voltages for all xsteps and ysteps, only recalculated if the grid, the lens, the sensitivity or the
+	#calibration changed, so the scan loops just index arrays. The grid is compared by its values (in place
+	#edits and new arrays keep their id or get an old one)
+	def voltageTables(self):
+		key = (self.lens.NA, self.lens.n, self.sensitivityDeg, self.calibrationPhi, self.calibrationTheta, numpy.asarray(self.xsteps, dtype=numpy.float64).tobytes(), numpy.asarray(self.ysteps, dtype=numpy.float64).tobytes())
+		if getattr(self, "_voltageTablesKey", None) != key:
+			self._voltageTables = (self.voltagePhi(self.xsteps).astype(numpy.float64), self.voltageTheta(self.ysteps).astype(numpy.float64))
+			self._voltageTablesKey = key
+		return self._voltageTables
+	
+	#visit a list of positions (mm, focus in piezo volts) in one buffered write, each one is held for dwell ms
+	def moveTo(self, xs, ys, focus=None, dwell=None):
+		xs, ys = numpy.broadcast_arrays(numpy.atleast_1d(xs), numpy.atleast_1d(ys))
+		samples = max(int(round((dwell if dwell is not None else self.exposureTime)/1000. * self.sampleRate)), 1)
+		data = numpy.empty((3, len(xs)*samples), dtype=numpy.float64)
+		data[0] = numpy.repeat(self.voltagePhi(xs), samples)
+		data[1] = numpy.repeat(self.voltageTheta(ys), samples)
+		if focus is None:
+			data[2] = self.currentPiezoVoltage
+		else:
+			piezo = self.baseVoltage - numpy.broadcast_to(numpy.atleast_1d(focus), xs.shape)
+			if numpy.any(piezo < 0):
+				raise(VoltageCannotBeNegativeException)
+			data[2] = numpy.repeat(piezo, samples)
+		self.runWaveform(data)
+		self.currentVoltagePhi, self.currentVoltageTheta, self.currentPiezoVoltage = data[:,-1]
+		self.trackPosition(xs[-1], ys[-1])
+	
 	#setAngles for the galvo (enter values in degree), private: use setX and setY for public access
 	def __setPhi(self, phi):
-		voltage = self.sensitivityDeg * phi + self.calibrationPhi
-		data = numpy.zeros((300,), dtype=numpy.float64)
-		data[:100] = voltage
-		data[100:200] = self.currentVoltageTheta
-		data[200:] = self.currentPiezoVoltage
-		self.testData = data
-		#set the state of the object
-		self.currentVoltagePhi = voltage
 		self.currentGalvoPhi = phi
-		
-		#write to the output channel
-		self.analog_output.WriteAnalogF64(100,False,-1,DAQmx_Val_GroupByChannel ,data,None,None)
-		self.analog_output.StartTask()
-		
-		self.analog_output.StopTask()
+		self.writeVoltages(self.sensitivityDeg * phi + self.calibrationPhi, self.currentVoltageTheta, self.currentPiezoVoltage)
 	def __setPhiRad(self, phiRad):
 		self.__setPhi(180./numpy.pi * phiRad)
 	
 	def __setTheta(self, theta):
-		voltage = self.sensitivityDeg * theta + self.calibrationTheta
-		data = numpy.zeros((300,), dtype=numpy.float64)
-		data[:100] = self.currentVoltagePhi
-		data[100:200] = voltage
-		data[200:] = self.currentPiezoVoltage
-		self.testData = data
-		#set the state of the object
-		self.currentVoltageTheta = voltage
 		self.currentGalvoTheta = theta
-		
-		#write to the output channel
-		self.analog_output.WriteAnalogF64(100,False,-1,DAQmx_Val_GroupByChannel ,data,None,None)
-		self.analog_output.StartTask()
-		#time.sleep(0.0001)
-		self.analog_output.StopTask()
+		self.writeVoltages(self.currentVoltagePhi, self.sensitivityDeg * theta + self.calibrationTheta, self.currentPiezoVoltage)
 	def __setThetaRad(self, thetaRad):
 		self.__setTheta(180./numpy.pi * thetaRad)
 		
 	def ReleaseObjects(self):
-		self.analog_output.StopTask()
-		self.analog_output.ClearTask()
-		self.analog_input.StopTask()
-		self.analog_input.ClearTask()
+		#devices which were never used are not connected just to release them
+		if self.deviceStarted("initDaq"):
+			self.analog_output.StopTask()
+			self.analog_output.ClearTask()
+			self.analog_input.StopTask()
+			self.analog_input.ClearTask()
 		self.uninitCamera()
-		TDC_deInit()
+		if self.deviceStarted("initTdc"):
+			self.tdc.deInit()
 		
 		
 	#units are mm: set x and y according to angle and sampledistance x and y is relative to the sample, so it is the
@@ -489,14 +923,17 @@ class Scanner:
 			self.currentY = Y
 	
 	def setPoint(self, x, y, directly=False):
-		self.setX(x if not directly else x + self.correctionFactor[0])
-		self.setY(y if not directly else y + self.correctionFactor[1])
-		if self.correctionFactor is not None:
+		self.setPosition(x if not directly else x + self.correctionFactor[0], y if not directly else y + self.correctionFactor[1])
+		if directly and self.correctionFactor is not None:
 			print("Correction factor: x -> %f, y -> %f"%(self.correctionFactor[0], self.correctionFactor[1]))
 	
 	def saveState(self, name="tmpArray"):
 		numpy.save(name, self.dataArray)
 		numpy.savetxt(name+".csv", self.dataArray, delimiter=',')
+		if self.dwellArray is not None and self.dwellArray.shape == self.dataArray.shape:
+			numpy.save(name+"_dwell_", self.dwellArray)
+		if self.channelArray is not None and self.channelArray.shape[:2] == self.dataArray.shape:
+			numpy.save(name+"_channels_", self.channelArray)
 		if self.histoData is not None:
 			numpy.save(name+"_histo_", self.histoData)
 			numpy.savetxt(name+"_histo_"+".csv", self.histoData)
@@ -504,44 +941,27 @@ class Scanner:
 	def goTo(self, x, y, directly=False):
 		self.currentXCoord = x
 		self.currentYCoord = y
-		self.setPoint( self.xsteps[int(x)], self.ysteps[int(y)], directly)
+		if directly:
+			self.setPoint( self.xsteps[int(x)], self.ysteps[int(y)], directly)
+		else:
+			self.setGridPoint(int(x), int(y))
 	def getGoToX(self,x):
 		return self.xsteps[int(x)]
 	def getGoToY(self, y):
 		return self.ysteps[int(y)]
 	
 	def showHistogram(self):
+		import matplotlib.pyplot as plt
 		plt.clf()
 		plt.scatter(self.dataArray)
 		plt.hist2d(self.dataArray)
 		
 	def plot3dmap(self, data, maskvalue=50000, multiple=False, fig=None):
+		import matplotlib.pyplot as plt
 		plt.clf()
 		if len(data) <= 0:
 			return
-		zlayers = []
-		for entry in data:
-			#read each file and load it
-			zlayers += [numpy.load(entry)]
-		#prepare the x-axes (since we have a rectangle we have height times the same x value)
-		
-		xdim = zlayers[0].shape[0]
-		ydim = zlayers[0].shape[1]
-		zdim = len(zlayers)
-		x_ = numpy.linspace(1,xdim, xdim)
-		y_ = numpy.linspace(1,ydim, ydim)
-		z_ = numpy.linspace(1,zdim, zdim)
-		x,y,z = numpy.meshgrid(x_,y_,z_, indexing='ij')
-		vol = xdim * ydim * zdim
-		x = x.reshape(vol,)
-		y = y.reshape(vol,)
-		z = z.reshape(vol,)
-	
-		c = numpy.array(zlayers)
-		c = c.reshape(xdim*ydim*zdim,order='F')
-		c = numpy.ma.masked_less(c, maskvalue)
-		
-		print("shapes", x.shape, y.shape,z.shape, c.shape)
+		x, y, z, c = self.focusStack(data, maskvalue)
 		#now we have prepared our data lets plot
 		from mpl_toolkits.mplot3d import Axes3D 
 		import matplotlib.pyplot as plt 
@@ -559,6 +979,29 @@ class Scanner:
 			plt.show()
 			plt.savefig("3dplot.jpeg")
 	
+	#coordinates (x: column, y: row, z: plane, counted from 1) and values of the voxels of the planes in the files
+	#of data which are not below maskvalue, the only ones which get plotted
+	def focusStack(self, data, maskvalue=50000):
+		zlayers = []
+		for entry in data:
+			#map each file instead of reading it, a file with a whole volume (saveVolume) gives all of its planes
+			layer = numpy.load(entry.strip(), mmap_mode='r')
+			if layer.ndim == 3:
+				zlayers += list(layer)
+			else:
+				zlayers += [layer]
+		x, y, z, c = [], [], [], []
+		#plane by plane, so only one plane and the selected voxels are in memory at a time
+		for plane, layer in enumerate(zlayers):
+			rows, columns = numpy.nonzero(layer >= maskvalue)
+			x += [columns + 1.]
+			y += [rows + 1.]
+			z += [numpy.full(len(rows), plane + 1.)]
+			c += [numpy.asarray(layer[rows, columns], dtype=numpy.float64)]
+		x, y, z, c = numpy.concatenate(x), numpy.concatenate(y), numpy.concatenate(z), numpy.concatenate(c)
+		print("shapes", x.shape, y.shape,z.shape, c.shape)
+		return x, y, z, c
+	
 	def processMouseClick(self, event):
 		print("Mouse clicked at, ", event.xdata, event.ydata)
 		if self.interrupt and event.xdata is not None and event.ydata is not None:
@@ -643,7 +1086,7 @@ class Scanner:
 		filled = False
 		import threading
 		while True:
-			ret = TDC_getCoincCounters(tmpBuffer)
+			ret = self.tdc.getCoincCounters(tmpBuffer)
 			if len(currentRate) > 100:
 				currentRate = currentRate[1:]
 				filled = True
@@ -672,14 +1115,14 @@ class Scanner:
 			except ImportError:
 				import Tkinter as Tk
 			from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2TkAgg
-			TDC_enableHbt(True)
+			self.tdc.enableHbt(True)
 			#we need to set binWidth according to TDC_timeBase
-			timeBase = TDC_getTimebase()
+			timeBase = self.tdc.getTimebase()
 			#time base is the resolution in seconds, so 
 			rightBinWidth = int((binWidth*1.0e-9) / timeBase)
 			#first set histogram parameter
 			print(timeBase, rightBinWidth, binCount)
-			TDC_setHbtParams(rightBinWidth,binCount)
+			self.tdc.setHbtParams(rightBinWidth,binCount)
 			#set up array with at least binCount elements
 
 			from matplotlib.figure import Figure
@@ -691,6 +1134,7 @@ class Scanner:
 			dataArray = numpy.zeros((binCount*2-1,))
 			t = numpy.linspace(-(binCount), binCount-1, 2*binCount-1)
 			if master is None:
+				import matplotlib.pyplot as plt
 				plt.clf()
 				plt.ion()
 				print("I WANT DATA", len(t), len(dataArray))
@@ -723,7 +1167,7 @@ class Scanner:
 			
 			#for normalization we need the integration time
 			startTime = time.time()
-			hbtFunction = TDC_createHbtFunction()
+			hbtFunction = self.tdc.createHbtFunction()
 			self.signalCorrection = False
 			while self.hbtLoop:
 				#retrieve histogram
@@ -731,32 +1175,19 @@ class Scanner:
 				if not self.hbtRunning:
 					#reset the histogram
 					print("reset TDC_getHbtCorrelations")
-					TDC_resetHbtCorrelations()
-					TDC_calcHbtG2(hbtFunction)
+					self.tdc.resetHbtCorrelations()
+					dataArray = self.hbtG2(hbtFunction)
 					startTime = time.time()
 					#be sure to not have a time diff of 0 seconds... (otherwise we divide by zero)
 					endTime = time.time()+1
 					self.hbtRunning = True
 					print("clear data")
 				else:
-					TDC_calcHbtG2(hbtFunction)
+					dataArray = self.hbtG2(hbtFunction)
 					endTime = time.time()
-				dataArray = numpy.array(hbtFunction[0][:], dtype=numpy.float64)
 				datalen = len(dataArray)
 				print(hbtFunction[0].indexOffset)
 				histAx.cla()
-				#normalize data (we assume to have a probabilty of one at large taus, so take the midvalue of the last 5 elements on each side)
-				#print(numpy.concatenate((dataArray[:5], dataArray[-5:])))
-				normConst = numpy.mean(numpy.concatenate((dataArray[:5], dataArray[-5:])))
-				if normConst > 0 and self.doNormalization:
-					dataArray /= normConst
-				
-				#TODO make correction not static
-				#we assume a poor signal to background noise of 0.5
-				if self.signalCorrection:
-					dataArray = (dataArray-(1-self.sigToBack**2))/self.sigToBack**2
-					b = dataArray<0
-					dataArray[b] = 0
 				histAx.set_ylim([0, numpy.max(dataArray)])
 				self.histo = histAx.plot(t,dataArray)
 				histAx.plot((t[0], t[-1]), (1,1), 'r-')
@@ -768,24 +1199,300 @@ class Scanner:
 			self.histoData = dataArray
 			dataArray = None
 			#histAx.cla()
-			TDC_releaseHbtFunction(hbtFunction)
+			self.tdc.releaseHbtFunction(hbtFunction)
 			
 	
 		
-	def scanSample(self, master=None, refToMain=None):
-		#at start we clearly have no interrupt
-		self.interrupt = False
-		self.startPoint = None
-		self.correctionFactor = (0,0)
-		#clear data array
-		#self.dataArray = numpy.ones((len(self.ysteps),len(self.xsteps)), dtype=numpy.float64)
+	#one update of showHBT: the g2 of the correlations so far (calcHbtG2 into hbtFunction) as array, normalised
+	#(doNormalization) and corrected for the background (signalCorrection)
+	def hbtG2(self, hbtFunction):
+		self.tdc.calcHbtG2(hbtFunction)
+		dataArray = numpy.array(hbtFunction[0][:], dtype=numpy.float64)
+		#normalize data (we assume to have a probabilty of one at large taus, so take the midvalue of the last 5 elements on each side)
+		#print(numpy.concatenate((dataArray[:5], dataArray[-5:])))
+		normConst = numpy.mean(numpy.concatenate((dataArray[:5], dataArray[-5:])))
+		if normConst > 0 and self.doNormalization:
+			dataArray /= normConst
+		
+		#TODO make correction not static
+		#we assume a poor signal to background noise of 0.5
+		if self.signalCorrection:
+			dataArray = (dataArray-(1-self.sigToBack**2))/self.sigToBack**2
+			b = dataArray<0
+			dataArray[b] = 0
+		return dataArray
+	
+	#convert sample coordinates in mm (scalars or arrays) into the galvo voltages, same math as setX/setY
+	def voltagePhi(self, X):
+		return self.sensitivityDeg * (180./numpy.pi) * numpy.arctan(numpy.asarray(X) * self.lens.LensNumber()) + self.calibrationPhi
+	def voltageTheta(self, Y):
+		return self.sensitivityDeg * (180./numpy.pi) * numpy.arctan(numpy.asarray(Y) * self.lens.LensNumber()) + self.calibrationTheta
+	#and back
+	def sampleX(self, voltage):
+		return numpy.tan((numpy.asarray(voltage) - self.calibrationPhi) / self.sensitivityDeg * (numpy.pi/180.)) / self.lens.LensNumber()
+	def sampleY(self, voltage):
+		return numpy.tan((numpy.asarray(voltage) - self.calibrationTheta) / self.sensitivityDeg * (numpy.pi/180.)) / self.lens.LensNumber()
+	
+	#sample coordinates (x, y arrays) of the focus at times (clock of the daq), a simulated daq knows where the
+	#galvos really are, otherwise it is the last position we set
+	def samplePosition(self, times):
+		#the galvos are where they were put unless a simulated daq is in use already
+		if "initDaq" in self._ready and hasattr(self.daq, "galvoVoltages"):
+			phi, theta, piezo = self.daq.galvoVoltages(times)
+			return self.sampleX(phi), self.sampleY(theta)
+		return numpy.full(numpy.shape(times), float(self.currentX)), numpy.full(numpy.shape(times), float(self.currentY))
+	
+	#number of sample clock ticks a pixel is held, the dwell time of a pixel is the exposure time of the tdc
+	#(with timestamp binning the dwell is free and given by pixelDwell)
+	def samplesPerPixel(self):
+		dwell = self.exposureTime
+		if self.acquisition == "timestamps" and self.pixelDwell is not None:
+			dwell = self.pixelDwell
+		return max(int(round(dwell/1000. * self.sampleRate)), 1)
+	
+	#waveform of one scan line (voltages of the pixels and of the line) grouped by channel (phi, theta, piezo) as WriteAnalogF64 wants it
+	def lineWaveform(self, phiVoltages, thetaVoltage):
+		samplesPerPixel = self.samplesPerPixel()
+		data = numpy.empty((3, len(phiVoltages)*samplesPerPixel), dtype=numpy.float64)
+		data[0] = numpy.repeat(phiVoltages, samplesPerPixel)
+		data[1] = thetaVoltage
+		data[2] = self.currentPiezoVoltage
+		return data
+	
+	#timestamp buffers for TDC_getLastTimestamps, allocated once and reused for every line
+	def timestampBuffers(self):
+		if not hasattr(self, "_timestampBuffers") or len(self._timestampBuffers[0]) != self.timestampBufferSize:
+			self.tdc.setTimestampBufferSize(self.timestampBufferSize)
+			timestamps = (c_longlong * self.timestampBufferSize)()
+			channels = (c_ubyte * self.timestampBufferSize)()
+			self._timestampBuffers = (timestamps, channels, c_int(), numpy.ctypeslib.as_array(timestamps), numpy.ctypeslib.as_array(channels))
+			self.timebase = self.tdc.getTimebase()
+		return self._timestampBuffers
+	
+	#drain all timestamps the tdc collected since the last call
+	def drainTimestamps(self):
+		timestamps, channels, valid, npTimestamps, npChannels = self.timestampBuffers()
+		self.tdc.getLastTimestamps(True, timestamps, channels, valid)
+		return npTimestamps[:valid.value].copy(), npChannels[:valid.value].copy()
+	
+	#start the (already written) line waveform and assign every photon to the pixel the galvo was on when it arrived,
+	#the ao start trigger is exported to the tdc marker channel, so it gives us the time origin of the line
+	def acquireTimestampLine(self, npixels, samplesPerPixel, lineTime):
+		self.analog_output.ExportSignal(DAQmx_Val_StartTrigger, self.lineTriggerOutput)
+		self.drainTimestamps()
+		self.analog_output.StartTask()
+		allTimestamps = []
+		allChannels = []
+		done = bool32()
+		deadline = time.time() + lineTime + 1.0
+		while not done.value and time.time() < deadline:
+			time.sleep(min(lineTime/10., 0.01))
+			self.analog_output.IsTaskDone(byref(done))
+			timestamps, channels = self.drainTimestamps()
+			allTimestamps += [timestamps]
+			allChannels += [channels]
+		#the last photons of the line may still be on their way through the tdc
+		time.sleep(0.001)
+		timestamps, channels = self.drainTimestamps()
+		allTimestamps += [timestamps]
+		allChannels += [channels]
+		pixelDwell = samplesPerPixel / self.sampleRate
+		photonChannels = self.photonChannels if self.photonChannels is not None else [c for c in range(TDC_INPUT_CHANNELS) if c != self.markerChannel]
+		counts = binTimestamps(numpy.concatenate(allTimestamps), numpy.concatenate(allChannels), self.markerChannel, photonChannels, self.timebase, pixelDwell, npixels)
+		if counts is None:
+			print("No line trigger on tdc channel %d, check lineTriggerOutput"%self.markerChannel)
+			return numpy.zeros((npixels,), dtype=numpy.float64)
+		return counts / pixelDwell
+	
+	#write a finite waveform (grouped by channel) to the card without starting it
+	def loadWaveform(self, data):
+		nsamples = data.shape[1]
+		written = int32()
+		if self.persistentOutput:
+			#the on demand task has to stop before we can put it on the sample clock
+			self.analog_output.StopTask()
+		self.analog_output.CfgSampClkTiming("",self.sampleRate,DAQmx_Val_Rising,DAQmx_Val_FiniteSamps,nsamples)
+		self.analog_output.WriteAnalogF64(nsamples,False,-1,DAQmx_Val_GroupByChannel,data,byref(written),None)
+		return nsamples / self.sampleRate
+	
+	#clock out a finite waveform and wait until the card is done
+	def runWaveform(self, data):
+		duration = self.loadWaveform(data)
+		self.analog_output.StartTask()
+		self.analog_output.WaitUntilTaskDone(duration + 1.0)
+		self.analog_output.StopTask()
+		self.restoreOutput()
+	
+	#put the output task back into the mode the single point writes rely on: either the long running
+	#on demand task (persistentOutput) or the continuous sample clock which is started for every write
+	def restoreOutput(self):
+		if self.persistentOutput:
+			self.analog_output.SetSampTimingType(DAQmx_Val_OnDemand)
+			self.analog_output.StartTask()
+		else:
+			self.analog_output.CfgSampClkTiming("",self.sampleRate,DAQmx_Val_Rising,DAQmx_Val_ContSamps,100)
+	
+	#hardware timed scan of one line: move to the start of the line, clock out the whole line as one buffered
+	#waveform and collect one counter update per pixel (the tdc exposure time is the pixel dwell time)
+	#voltages = (phi voltages of xsteps, theta voltage of y) if they are known already (see voltageTables),
+	#counts (len(xsteps), TDC_COINC_CHANNELS) gets the counters of every pixel (counter acquisition only)
+	def scanLine(self, xsteps, y, tmpBuffer, voltages=None, counts=None):
+		if voltages is None:
+			voltages = (self.voltagePhi(xsteps), float(self.voltageTheta(y)))
+		phiVoltages, thetaVoltage = voltages
+		start = time.perf_counter()
+		self.writeVoltages(phiVoltages[0], thetaVoltage, self.currentPiezoVoltage)
+		self.trackPosition(xsteps[0], y)
+		data = self.lineWaveform(phiVoltages, thetaVoltage)
+		#the move to the start of the line is the flyback, the rest of the line is small steps
+		settling = self.settle()
+		line = self.acquireWaveform(data, len(xsteps), tmpBuffer, counts)
+		#the card holds the last sample, so we are at the end of the line now
+		self.currentVoltagePhi = data[0][-1]
+		self.trackPosition(xsteps[-1], y)
+		self.lineTiming.add(time.perf_counter() - start - settling - data.shape[1] / self.sampleRate)
+		return line
+	
+	#clock out a waveform of npixels pixels (samplesPerPixel samples each) and return the rate of every pixel,
+	#either from one counter update per pixel or from the binned timestamps
+	def acquireWaveform(self, data, npixels, tmpBuffer, counts=None):
+		nsamples = data.shape[1]
+		duration = nsamples / self.sampleRate
+		self.loadWaveform(data)
+		if self.acquisition == "timestamps":
+			rates = self.acquireTimestampLine(npixels, nsamples // npixels, duration)
+		else:
+			rates = self.acquireCounterLine(npixels, duration, tmpBuffer, counts)
+		self.analog_output.WaitUntilTaskDone(duration + 1.0)
+		self.analog_output.StopTask()
+		self.restoreOutput()
+		return rates
+	
+	#start the (already written) line waveform and take one counter frame per pixel. The frames of the tdc run
+	#freely: the one running when the card started is dropped, frame k of the line is the k-th frame after it.
+	#Those frames start delta pixels after the pixels, so the line is shifted back by delta. Frames we polled too
+	#late for are lost, their pixels are NaN (counts 0) instead of a copy of a neighbour
+	def acquireCounterLine(self, npixels, lineTime, tmpBuffer, counts=None):
+		frameTime = self.exposureTime/1000.
+		rates = numpy.full((npixels,), numpy.nan)
+		frames = numpy.zeros((npixels, TDC_COINC_CHANNELS), dtype=numpy.int64)
+		updates = c_int()
+		self.analog_output.StartTask()
+		started = time.perf_counter()
+		deadline = started + 2*lineTime + 1.0
+		#throw away the frames which finished before, then wait for the end of the one running now (polled
+		#without sleeping: a sleep can take much longer than a frame on windows)
+		self.tdc.getCoincCounters(tmpBuffer, updates)
+		updates.value = 0
+		while updates.value <= 0 and time.perf_counter() < deadline:
+			self.tdc.getCoincCounters(tmpBuffer, updates)
+		delta = (time.perf_counter() - started) / frameTime
+		frame = 0
+		while frame < npixels and time.perf_counter() < deadline:
+			time.sleep(0)
+			self.tdc.getCoincCounters(tmpBuffer, updates)
+			if updates.value <= 0:
+				continue
+			#only the latest of the new frames is in the counters
+			frame += updates.value
+			if frame <= npixels:
+				rates[frame-1] = numpy.sum(tmpBuffer) / frameTime
+				frames[frame-1] = tmpBuffer
+		lost = int(numpy.count_nonzero(numpy.isnan(rates)))
+		if lost > 0:
+			print("%d of %d counter frames of the line were lost"%(lost, npixels))
+		#pixel p was seen by frame p - delta (the pixels next to a lost frame become NaN as well)
+		rates = shiftLine(rates, -delta)
+		if counts is not None:
+			for counter in range(TDC_COINC_CHANNELS):
+				counts[:,counter] = numpy.rint(shiftLine(frames[:,counter], -delta))
+			counts[numpy.isnan(rates)] = 0
+		return rates
+	
+	#count rate at the current position and the dwell in ms, either one exposure or adaptive. counts
+	#(TDC_COINC_CHANNELS) gets the counts of the single counters
+	def acquirePixel(self, tmpBuffer, updates, backgroundRate=None, counts=None):
+		if self.adaptiveDwell:
+			#integrate until the pixel is good enough, the rate is counts per actual dwell
+			return self.acquireAdaptivePixel(tmpBuffer, updates, backgroundRate, counts)
+		#retrieve count rate from adp, the caller waited for a whole frame at this position (settle(True))
+		self.tdc.getCoincCounters(tmpBuffer)
+		if counts is not None:
+			counts[:] = tmpBuffer
+		#the value we get is the pure count number, so divide by exposure time
+		rate = numpy.sum(tmpBuffer) / (self.exposureTime/1000)
+		return rate, self.exposureTime
+	
+	#integrate the current pixel frame by frame (one frame is one tdc exposure) until dwellFinished says it
+	#is good enough, returns the rate and the dwell in ms
+	def acquireAdaptivePixel(self, tmpBuffer, updates, backgroundRate=None, counts=None):
+		frameTime = self.exposureTime/1000.
+		total = 0
+		frames = 0
+		if counts is not None:
+			counts[:] = 0
+		#the frame which is in the counters now and the next one began before the galvos settled (see settle)
+		self.tdc.getCoincCounters(tmpBuffer, updates)
+		seen = 0
+		deadline = time.time() + 2*self.maxDwell/1000. + 1.0
+		while not dwellFinished(total, frames*frameTime, self.targetError, self.minDwell/1000., self.maxDwell/1000., backgroundRate):
+			if time.time() > deadline:
+				break
+			time.sleep(frameTime)
+			self.tdc.getCoincCounters(tmpBuffer, updates)
+			seen += updates.value
+			if updates.value <= 0 or seen < 2:
+				continue
+			#if frames got lost we only know the latest one, so only that one counts for the dwell
+			total += numpy.sum(tmpBuffer)
+			if counts is not None:
+				counts += tmpBuffer
+			frames += 1
+		if frames == 0:
+			return 0.0, 0.0
+		return total / (frames*frameTime), frames*self.exposureTime
+	
+	#shift a backward line (already flipped into the forward direction) by the line phase so it registers
+	#with the forward lines, with linePhase "auto" the phase is estimated against the line above
+	def registerReverseLine(self, row):
+		phase = self.linePhase
+		if phase == "auto":
+			if row > 0:
+				estimate = estimateLinePhase(self.dataArray[row-1], self.dataArray[row], minCorrelation=self.linePhaseCorrelation)
+				if estimate is not None:
+					self.lineEstimates += [estimate]
+			#median, so a single line with an emitter at the edge does not throw us off
+			phase = numpy.median(self.lineEstimates) if len(self.lineEstimates) > 0 else 0.0
+		if phase != 0:
+			self.dataArray[row] = shiftLine(self.dataArray[row], phase)
+			if self.channelMaps and self.channelArray is not None and self.channelArray.shape[:2] == self.dataArray.shape:
+				counters = self.channelArray[row]
+				for counter in range(counters.shape[1]):
+					counters[:,counter] = numpy.rint(shiftLine(counters[:,counter], phase))
+		return phase
+	
+	#rate map (counts/s) of the sum of some counters of the last channel map scan, counters are indexes or
+	#names (TDC_COINC_NAMES, e.g. "1" for the first detector or "1/2" for its coincidences with the second)
+	def channelMap(self, counters):
+		indexes = [TDC_COINC_NAMES.index(c.strip()) if isinstance(c, str) else int(c) for c in counters]
+		counts = numpy.sum(self.channelArray[:,:,indexes], axis=2)
+		if self.adaptiveDwell and self.dwellArray is not None and self.dwellArray.shape == counts.shape:
+			#pixels without a single frame have no dwell and stay empty
+			return numpy.where(self.dwellArray > 0, counts / numpy.maximum(self.dwellArray, 1e-9) * 1000., 0.)
+		return counts / (self.exposureTime/1000.)
+	
+	#create the live image of dataArray (in the gui if we have one) and start its renderer
+	def createScanView(self, master=None, refToMain=None):
+		if self.headless:
+			#nothing is drawn, no gui module gets imported
+			from LiveView import NullRenderer
+			self.renderer = NullRenderer()
+			return self.renderer
 		try:
 			import tkinter as Tk
 		except ImportError:
 			import Tkinter as Tk
 		from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2TkAgg
-		countX = 0
-		countY = 0
 		from matplotlib.colors import LogNorm
 		from matplotlib.figure import Figure
 		f = Figure(figsize=(4,4), dpi=100)
@@ -821,113 +1528,602 @@ class Scanner:
 		#register mouse callback to be able to navigate to
 		f.canvas.mpl_connect('button_press_event', self.processMouseClick)
 		canvasWidget.pack(side=tk.BOTTOM, fill=tk.BOTH, expand=True)
-		
-		tmpB = c_int *19
-		tmpBuffer = tmpB()
-		#TDC_setExposureTime(self.exposureTime)
-		for i in self.ysteps:
-			countX = 0
-			for o in self.xsteps:
-				#navigate to location
-				self.setPoint( o, i)
-				#retrieve count rate from adp
-				ret = TDC_getCoincCounters(tmpBuffer)
-				
-				#set the count rate (the value we get is the pure count number, so divide by exposure time)
-				self.dataArray[countY][countX] = numpy.sum(tmpBuffer) / (self.exposureTime/1000)
-							
-				countX += 1
-				#set data and new limits for better color plotting
-				self.imgplot.set_data(self.dataArray)
-				self.imgplot.set_clim(numpy.min(self.dataArray), numpy.max(self.dataArray))
-				
-				#update the canvas with the new data
-				f.canvas.draw()
-				time.sleep(self.exposureTime/1000)
-				if self.interrupt:
-					#if we have an interrupt stop scanning and clean the resources
-					#update the master (we only can get interrupts from the gui, so its save to assume that master is not None)
-					master.update()
-					
-					#make sure the interrupt is set
-					self.interrupt = True
-					#clear the buffer, otherwise we get memory leaks and issues which let the python interpreter crash)
-					tmpBuffer = None
-					tmpB = None
-					
-					#navigate back to origin
-					self.setPoint(0,0)
-					
-					return
-			countY += 1
-		if master is None:
+		#drawing is done by the renderer at frameRate, the scan loops only report new values
+		from LiveView import ScanRenderer
+		self.renderer = ScanRenderer(f, self.fplt, self.imgplot, self.dataArray, self.frameRate)
+		self.renderer.start()
+		return self.renderer
+	
+	def scanSample(self, master=None, refToMain=None):
+		#at start we clearly have no interrupt
+		self.interrupt = False
+		self.startPoint = None
+		self.correctionFactor = (0,0)
+		#clear data array
+		#self.dataArray = numpy.ones((len(self.ysteps),len(self.xsteps)), dtype=numpy.float64)
+		self.createScanView(master, refToMain)
+		self.openScanFile()
+		try:
+			completed = self.scanGrid(master)
+		finally:
+			#the lines scanned before an error stay readable
+			self.closeScanFile()
+		self.saveTimingProfile()
+		if not completed:
+			return
+		self.renderer.stop()
+		if master is None and not self.headless:
 			#only save the sample scan if we are not from gui (otherwise we see it there...)
+			import matplotlib.pyplot as plt
 			plt.savefig("sampleScan.jpeg")
 			plt.ioff()	
-
-		#same as for the interrupt
-		tmpB = None
-		tmpBuffer = None
 	
+	#scan xsteps x ysteps into dataArray with the current settings, the live view (self.renderer) has to
+	#exist already. Returns False if the scan was interrupted
+	#(starting at startLine, plane is the index of the plane when called from scanVolume)
+	def scanGrid(self, master=None, startLine=0, plane=None):
+		state = self.gridState(startLine, plane)
+		for countY in range(startLine, len(self.ysteps)):
+			try:
+				completed = self.scanGridLine(countY, state, master)
+			except Exception:
+				#hardware errors (e.g. usb connection of the card or the tdc lost), keep the finished lines
+				self.checkpoint(countY, plane, True)
+				raise
+			if not completed:
+				self.checkpoint(countY, plane, True)
+				return False
+			self.streamLine(countY, plane)
+			self.checkpoint(countY+1, plane)
+		return True
+	
+	#everything the lines of a grid scan share: counter buffers, voltage tables and the background estimate
+	#(plane: the grid is a plane of a volume scan, its channelArray is part of volumeChannelArray)
+	def gridState(self, startLine=0, plane=None):
+		state = EmptyObject()
+		state.tmpBuffer = (c_int*19)()
+		state.updates = c_int()
+		state.xVoltages, state.yVoltages = self.voltageTables()
+		state.backgroundRate = None if self.backgroundRate == "auto" else self.backgroundRate
+		self.lineEstimates = []
+		if self.adaptiveDwell:
+			if startLine == 0 or self.dwellArray is None or self.dwellArray.shape != self.dataArray.shape:
+				#dwell time in ms of every pixel, needed to get from the rates back to counts
+				self.dwellArray = numpy.zeros(self.dataArray.shape, dtype=numpy.float64)
+			if startLine > 0 and self.backgroundRate == "auto":
+				state.backgroundRate = numpy.median(self.dataArray[startLine-1])
+		else:
+			#no dwell times of an earlier adaptive scan next to this map (saveState)
+			self.dwellArray = None
+		state.counters = None
+		if self.channelMaps:
+			if self.scanMode == "waveform" and self.acquisition == "timestamps":
+				print("channel maps need the counter acquisition, channelArray is not filled")
+			elif (startLine == 0 and plane is None) or self.channelArray is None or self.channelArray.shape[:2] != self.dataArray.shape:
+				self.channelArray = None
+				self.channelArray = self.allocateArray(self.dataArray.shape + (TDC_COINC_CHANNELS,), "_channels", numpy.int32, 0)
+			#numpy view of the counter buffer
+			state.counters = numpy.ctypeslib.as_array(state.tmpBuffer)
+		return state
+	
+	#scan line countY of the grid into dataArray, returns False if the scan was interrupted
+	def scanGridLine(self, countY, state, master=None):
+		i = self.ysteps[countY]
+		xVoltages, yVoltages = state.xVoltages, state.yVoltages
+		#in bidirectional mode every odd line runs from right to left, so there is no flyback
+		reverse = self.bidirectional and countY % 2 == 1
+		if self.scanMode == "waveform":
+			#the whole line is clocked out by the card, so we only touch python once per line
+			counts = self.channelArray[countY] if state.counters is not None else None
+			if reverse:
+				self.dataArray[countY] = self.scanLine(self.xsteps[::-1], i, state.tmpBuffer, (xVoltages[::-1], yVoltages[countY]), counts[::-1] if counts is not None else None)[::-1]
+				self.registerReverseLine(countY)
+			else:
+				self.dataArray[countY] = self.scanLine(self.xsteps, i, state.tmpBuffer, (xVoltages, yVoltages[countY]), counts)
+			self.renderer.update(self.dataArray[countY])
+			if self.interrupt:
+				self.abortScan(master)
+				return False
+			return True
+		for countX in (range(len(self.xsteps)-1, -1, -1) if reverse else range(len(self.xsteps))):
+			start = time.perf_counter()
+			#navigate to location (only indexes the voltage tables)
+			self.writeVoltages(xVoltages[countX], yVoltages[countY], self.currentPiezoVoltage)
+			self.trackPosition(self.xsteps[countX], i)
+			#short for the neighbour pixel, long for the flyback to the start of the line, followed by a
+			#frame taken at the new position (the adaptive acquisition waits for its frames itself)
+			settling = self.settle(not self.adaptiveDwell)
+			counts = self.channelArray[countY][countX] if state.counters is not None else None
+			self.dataArray[countY][countX], dwell = self.acquirePixel(state.tmpBuffer, state.updates, state.backgroundRate, counts)
+			if self.adaptiveDwell:
+				self.dwellArray[countY][countX] = dwell
+				settling += dwell/1000.
+			
+			#new limits for better color plotting, the canvas is updated by the renderer
+			self.renderer.update(self.dataArray[countY][countX])
+			self.pixelTiming.add(time.perf_counter() - start - settling)
+			if self.interrupt:
+				self.abortScan(master)
+				return False
+		if reverse:
+			self.registerReverseLine(countY)
+		if self.adaptiveDwell and self.backgroundRate == "auto":
+			#most of the sample is background, so the median of the last line is a good guess
+			state.backgroundRate = numpy.median(self.dataArray[countY])
+		return True
+	
+	#clean up after an interrupt of a scan
+	def abortScan(self, master=None):
+		self.renderer.stop()
+		#update the master (interrupts usually come from the gui)
+		if master is not None:
+			master.update()
+		#make sure the interrupt is set
+		self.interrupt = True
+		#navigate back to origin
+		self.setPoint(0,0)
+	
+	#xyz scan over zsteps (focus values, see setFocus): volumeOrder "plane" scans one full plane after the other,
+	#"line" scans every line at all focus values before moving on to the next line (less drift between planes).
+	#The result is self.volumeArray (z, y, x), with channelMaps the counters are in volumeChannelArray (z, y, x, counter)
+	#startPlane/startLine continue a scan into the existing volumeArray (see resumeScan)
+	def scanVolume(self, master=None, refToMain=None, startPlane=0, startLine=0):
+		self.interrupt = False
+		saved = self.dataArray
+		if startPlane == 0 and startLine == 0:
+			self.volumeArray = None
+			self.volumeArray = self.allocateArray((len(self.zsteps), len(self.ysteps), len(self.xsteps)), "_volume")
+		savedChannels = self.channelArray
+		if self.channelMaps and not (self.scanMode == "waveform" and self.acquisition == "timestamps"):
+			if (startPlane == 0 and startLine == 0) or self.volumeChannelArray is None or self.volumeChannelArray.shape[:3] != self.volumeArray.shape:
+				self.volumeChannelArray = None
+				self.volumeChannelArray = self.allocateArray(self.volumeArray.shape + (TDC_COINC_CHANNELS,), "_volume_channels", numpy.int32, 0)
+		else:
+			self.volumeChannelArray = None
+		self.selectPlane(min(startPlane, len(self.zsteps)-1))
+		view = self.createScanView(master, refToMain)
+		self.openScanFile(self.zsteps, startPlane > 0 or startLine > 0)
+		try:
+			state = self.gridState(startLine, startPlane)
+			completed = True
+			if self.volumeOrder == "line":
+				for countY in range(startLine, len(self.ysteps)):
+					try:
+						for countZ in range(len(self.zsteps)):
+							self.setFocus(self.zsteps[countZ])
+							#dataArray is a view of the plane, so the line goes directly into the volume
+							self.selectPlane(countZ)
+							completed = self.scanGridLine(countY, state, master)
+							if not completed:
+								break
+							self.streamLine(countY, countZ)
+					except Exception:
+						self.checkpoint(countY, 0, True)
+						raise
+					if not completed:
+						self.checkpoint(countY, 0, True)
+						break
+					self.checkpoint(countY+1, 0)
+				view.setData(self.volumeArray[0])
+			else:
+				for countZ in range(startPlane, len(self.zsteps)):
+					self.setFocus(self.zsteps[countZ])
+					self.selectPlane(countZ)
+					view.setData(self.dataArray)
+					completed = self.scanGrid(master, startLine if countZ == startPlane else 0, countZ)
+					if not completed:
+						break
+		finally:
+			self.closeScanFile()
+		self.saveTimingProfile()
+		if completed:
+			view.stop()
+		self.dataArray = saved
+		self.channelArray = savedChannels
+		if hasattr(self, "focus"):
+			self.setFocus(self.focus)
+	
+	#make plane z of the volume the current map, dataArray (and channelArray) are views into the volume
+	def selectPlane(self, z):
+		self.dataArray = self.volumeArray[z]
+		if self.volumeChannelArray is not None:
+			self.channelArray = self.volumeChannelArray[z]
+	
+	#save the last volume scan as <name>.npy (z, y, x) and its counters as <name>_channels_.npy (z, y, x, counter)
+	def saveVolume(self, name="tmpVolume"):
+		numpy.save(name.strip(), self.volumeArray)
+		if self.volumeChannelArray is not None and self.volumeChannelArray.shape[:3] == self.volumeArray.shape:
+			numpy.save(name.strip()+"_channels_", self.volumeChannelArray)
+	
+	#everything of the scanner json can store (the resolved config including all imports and the calibration),
+	#scan results and hardware handles are left out
+	def resolvedSettings(self):
+		from ScanFile import jsonValue
+		settings = {}
+		for key, value in vars(self).items():
+			if key.startswith("_") or key in self.scanDataAttributes or key == "initTiming":
+				continue
+			try:
+				settings[key] = jsonValue(value)
+			except TypeError:
+				pass
+		settings["lens"] = {"NA" : self.lens.NA, "n" : self.lens.n}
+		if self.sampleSize is not None:
+			settings["sampleSize"] = {"_sample_size_" : True, "height" : self.sampleSize.height, "width" : self.sampleSize.width}
+		return settings
+	
+	#start streaming into scanFile (if set), append continues a resumed scan
+	def openScanFile(self, zsteps=None, append=False):
+		if self.scanFile is None:
+			return
+		from ScanFile import ScanWriter
+		self.scanWriter = ScanWriter(self.scanFile.strip(), self.xsteps, self.ysteps, zsteps, self.resolvedSettings(), self.scanFileChunkLines, append)
+		#the counters of every pixel go to <scanFile>_channels (lines of (x, counter))
+		self.channelWriter = None
+		if self.channelMaps:
+			self.channelWriter = ScanWriter(self.scanFile.strip()+"_channels", self.xsteps, self.ysteps, zsteps, self.resolvedSettings(), self.scanFileChunkLines, append)
+	
+	def streamLine(self, countY, plane=None):
+		if self.scanWriter is not None:
+			self.scanWriter.writeLine(countY, self.dataArray[countY], 0 if plane is None else plane)
+		if self.scanWriter is not None and self.channelWriter is not None and self.channelArray is not None:
+			self.channelWriter.writeLine(countY, self.channelArray[countY], 0 if plane is None else plane)
+	
+	def closeScanFile(self):
+		if self.scanWriter is None:
+			return
+		timing = {"ao" : self.aoTiming.asDict(), "pixel" : self.pixelTiming.asDict(), "line" : self.lineTiming.asDict()}
+		self.scanWriter.close(timing)
+		self.scanWriter = None
+		if self.channelWriter is not None:
+			self.channelWriter.close(timing)
+			self.channelWriter = None
+	
+	#merge the overheads measured so far (and extra values) into the timingProfile file for ScanPlanner
+	def saveTimingProfile(self, extra=None):
+		import json
+		import os.path
+		if self.timingProfile is None:
+			return
+		profile = {}
+		if os.path.isfile(self.timingProfile):
+			profile = json.loads(open(self.timingProfile).read())
+		if self.pixelTiming.count > 0:
+			profile["pixelOverhead"] = self.pixelTiming.mean()
+		if self.lineTiming.count > 0:
+			profile["lineOverhead"] = self.lineTiming.mean()
+		if self.aoTiming.count > 0:
+			profile["ao"] = self.aoTiming.mean()
+		if hasattr(self, "renderer") and self.renderer.draws > 0:
+			profile["render"] = self.renderer.drawTime / self.renderer.draws
+		if self.adaptiveDwell and self.dwellArray is not None and numpy.any(self.dwellArray > 0):
+			profile["meanDwell"] = float(numpy.mean(self.dwellArray[self.dwellArray > 0]))
+		if extra is not None:
+			profile.update(extra)
+		profile["updated"] = time.time()
+		open(self.timingProfile, "w").write(json.dumps(profile, indent=1))
+	
+	#write dataArray with its axes and the settings to the container <name> (ScanFile.ScanFile reads it)
+	def saveScanFile(self, name="tmpScan"):
+		from ScanFile import writeScan
+		writeScan(name.strip(), self.dataArray, self.xsteps, self.ysteps, None, self.resolvedSettings(), self.scanFileChunkLines)
+	
+	#write a checkpoint if one is due, line is the number of finished lines (of the plane, plane is None
+	#for a single grid scan)
+	def checkpoint(self, line, plane=None, force=False):
+		if self.checkpointFile is None:
+			return
+		if force or line % self.checkpointInterval == 0 or line == len(self.ysteps):
+			self.writeCheckpoint(line, plane)
+	
+	#<checkpointFile>.npy holds the map (or the volume), <checkpointFile>_channels_.npy its counters (channelMaps)
+	#and <checkpointFile>.json is a config file with the settings of the scan and the position to continue from.
+	#All are written to a temporary file first and then renamed, so a crash while writing does not destroy the
+	#last checkpoint
+	def writeCheckpoint(self, line, plane=None):
+		import json
+		import os
+		name = self.checkpointFile.strip()
+		data = self.dataArray if plane is None else self.volumeArray
+		dataFile = self.checkpointArray(data, name)
+		counters = self.channelArray if plane is None else self.volumeChannelArray
+		channelFile = None
+		if self.channelMaps and counters is not None:
+			channelFile = self.checkpointArray(counters, name+"_channels_")
+		if plane is None and self.adaptiveDwell and self.dwellArray is not None:
+			numpy.save(name+"_dwell_.tmp.npy", self.dwellArray)
+			os.replace(name+"_dwell_.tmp.npy", name+"_dwell_.npy")
+		settings = {}
+		for key in self.checkpointSettings:
+			if hasattr(self, key):
+				value = getattr(self, key)
+				if isinstance(value, (numpy.ndarray, numpy.generic)):
+					value = value.tolist()
+				settings[key] = value
+		cursor = {"kind" : "grid" if plane is None else "volume", "plane" : 0 if plane is None else plane, "line" : line, "data" : dataFile, "channels" : channelFile, "time" : time.time()}
+		with open(name+".tmp.json", "w") as f:
+			f.write(json.dumps({"settings" : settings, "checkpoint" : cursor}, indent=1))
+		os.replace(name+".tmp.json", name+".json")
+	
+	#write data to <name>.npy, returns the file which holds it
+	def checkpointArray(self, data, name):
+		import os
+		if isinstance(data, numpy.memmap):
+			#the array lives in a file already, it only has to be written out
+			data.flush()
+			return data.filename
+		numpy.save(name+".tmp.npy", data)
+		os.replace(name+".tmp.npy", name+".npy")
+		return name+".npy"
+	
+	#continue an interrupted scanSample or scanVolume from its last checkpoint (default: checkpointFile),
+	#the settings of the scan are restored from the checkpoint and the following checkpoints go to the same file
+	def resumeScan(self, checkpointFile=None, master=None, refToMain=None):
+		import os.path
+		name = (checkpointFile if checkpointFile is not None else self.checkpointFile).strip()
+		spec = readConfig(name+".json")
+		for key in spec["settings"]:
+			setattr(self, key, spec["settings"][key])
+		for key in ("xsteps", "ysteps", "zsteps"):
+			setattr(self, key, numpy.asarray(getattr(self, key), dtype=numpy.float64))
+		self.tdc.setExposureTime(self.exposureTime)
+		self.checkpointFile = name
+		cursor = spec["checkpoint"]
+		dataFile = cursor.get("data", name+".npy")
+		#the counters of the finished lines (channelMaps), the scan continues writing into them
+		channelFile = cursor.get("channels")
+		counters = None
+		if self.channelMaps and channelFile is not None and os.path.isfile(channelFile):
+			counters = self.loadArray(channelFile)
+		self.interrupt = False
+		self.startPoint = None
+		self.correctionFactor = (0,0)
+		if cursor["kind"] == "volume":
+			self.volumeArray = self.loadArray(dataFile)
+			self.volumeChannelArray = counters
+			plane, line = cursor["plane"], cursor["line"]
+			if self.volumeOrder != "line" and line >= len(self.ysteps):
+				#the plane was finished
+				plane, line = plane+1, 0
+			print("resume volume scan at plane %d, line %d"%(plane, line))
+			self.scanVolume(master, refToMain, plane, line)
+			return
+		if hasattr(self, "focus"):
+			self.setFocus(self.focus)
+		self.dataArray = self.loadArray(dataFile)
+		self.channelArray = counters
+		if self.adaptiveDwell and os.path.isfile(name+"_dwell_.npy"):
+			self.dwellArray = numpy.load(name+"_dwell_.npy")
+		print("resume scan at line %d of %d"%(cursor["line"], len(self.ysteps)))
+		self.createScanView(master, refToMain)
+		self.openScanFile(append=True)
+		try:
+			completed = self.scanGrid(master, cursor["line"])
+		finally:
+			self.closeScanFile()
+		self.saveTimingProfile()
+		if not completed:
+			return
+		self.renderer.stop()
+	
+	#load a saved map to continue writing into it, mapped (not read) if memmapFile is set
+	def loadArray(self, dataFile):
+		if self.memmapFile is None:
+			return numpy.load(dataFile)
+		return numpy.load(dataFile, mmap_mode="r+")
+	
+	#coarse to fine scan: measure every quadtreeStep-th pixel of the grid, then split the cells which are
+	#brighter than quadtreeThreshold or differ more than quadtreeGradient from their neighbours (both rates,
+	#"auto": quadtreeSigma poisson sigmas above the median of the coarse pass) until single pixels are reached.
+	#The multi resolution result is kept in self.quadtree, dataArray gets the resampled regular map
+	def scanQuadtree(self, master=None, refToMain=None):
+		from AdaptiveScan import QuadTreeMap
+		self.interrupt = False
+		self.quadtree = QuadTreeMap(self.dataArray.shape, self.quadtreeStep)
+		self.createScanView(master, refToMain)
+		tmpBuffer = (c_int*19)()
+		updates = c_int()
+		threshold = None
+		while True:
+			pending = self.quadtree.pending()
+			if len(pending) == 0:
+				break
+			values = numpy.zeros((len(pending),), dtype=numpy.float64)
+			for count, (iy, ix) in enumerate(pending):
+				self.setGridPoint(ix, iy)
+				self.settle(not self.adaptiveDwell)
+				values[count], dwell = self.acquirePixel(tmpBuffer, updates)
+				self.quadtree.add(iy, ix, values[count])
+				if self.interrupt:
+					self.quadtree.toArray(self.dataArray)
+					self.renderer.stop()
+					self.setPoint(0,0)
+					return
+			self.quadtree.toArray(self.dataArray)
+			self.renderer.update(values)
+			if threshold is None:
+				#the coarse pass is mostly background, the noise of a rate is sqrt(rate/dwell)
+				background = numpy.median(values)
+				sigma = numpy.sqrt(max(background, 1.0) / (self.exposureTime/1000.))
+				threshold = background + self.quadtreeSigma*sigma if self.quadtreeThreshold == "auto" else self.quadtreeThreshold
+				gradient = self.quadtreeSigma*numpy.sqrt(2)*sigma if self.quadtreeGradient == "auto" else self.quadtreeGradient
+			if self.quadtree.refine(threshold, gradient) == 0:
+				break
+		print("quadtree scan measured %.1f %% of the pixels"%(100*self.quadtree.coverage()))
+		self.renderer.stop()
+		self.saveTimingProfile({"quadtreeCoverage" : self.quadtree.coverage()})
+	
+	#normalize a scan region: a config file name (xsteps, ysteps and focus of its settings, named after the file),
+	#a dict with name, xsteps, ysteps and optional focus or a dict with name and points [(x, y), ...]
+	def regionSpec(self, region):
+		import os.path
+		if isinstance(region, str):
+			settings = readConfig(region.strip()).get("settings", {})
+			region = {"name" : os.path.splitext(os.path.basename(region.strip()))[0], "xsteps" : settings["xsteps"], "ysteps" : settings["ysteps"], "focus" : settings.get("focus")}
+		region = dict(region)
+		region.setdefault("focus", None)
+		if "points" in region:
+			region["points"] = numpy.asarray(region["points"], dtype=numpy.float64)
+			region["entry"] = tuple(region["points"][0][:2])
+			region["exit"] = tuple(region["points"][-1][:2])
+		else:
+			xsteps, ysteps = region["xsteps"], region["ysteps"]
+			#bidirectional scans with an even number of lines end where they started
+			endX = xsteps[0] if self.bidirectional and len(ysteps) % 2 == 0 else xsteps[-1]
+			region["entry"] = (xsteps[0], ysteps[0])
+			region["exit"] = (endX, ysteps[-1])
+		return region
+	
+	#hardware timed scan along an arbitrary path: xs, ys in mm (zs focus values, None: keep the focus), every
+	#point is held for one pixel dwell (see samplesPerPixel). The path is clocked out in pieces of
+	#trajectoryChunk points. The result is self.trajectoryData with the rows (x, y, focus, rate)
+	def scanTrajectory(self, xs, ys, zs=None):
+		self.interrupt = False
+		xs, ys = numpy.broadcast_arrays(numpy.atleast_1d(numpy.asarray(xs, dtype=numpy.float64)), numpy.atleast_1d(numpy.asarray(ys, dtype=numpy.float64)))
+		if zs is None:
+			piezo = numpy.full(xs.shape, self.currentPiezoVoltage)
+		else:
+			piezo = self.baseVoltage - numpy.broadcast_to(numpy.asarray(zs, dtype=numpy.float64), xs.shape)
+			if numpy.any(piezo < 0):
+				raise(VoltageCannotBeNegativeException)
+		phi = self.voltagePhi(xs)
+		theta = self.voltageTheta(ys)
+		samplesPerPixel = self.samplesPerPixel()
+		tmpBuffer = (c_int*19)()
+		values = numpy.zeros(xs.shape, dtype=numpy.float64)
+		#to the start of the path
+		self.writeVoltages(phi[0], theta[0], piezo[0])
+		self.settle()
+		for start in range(0, len(xs), self.trajectoryChunk):
+			end = min(start + self.trajectoryChunk, len(xs))
+			data = numpy.empty((3, (end-start)*samplesPerPixel), dtype=numpy.float64)
+			data[0] = numpy.repeat(phi[start:end], samplesPerPixel)
+			data[1] = numpy.repeat(theta[start:end], samplesPerPixel)
+			data[2] = numpy.repeat(piezo[start:end], samplesPerPixel)
+			values[start:end] = self.acquireWaveform(data, end-start, tmpBuffer)
+			self.currentVoltagePhi, self.currentVoltageTheta, self.currentPiezoVoltage = data[:,-1]
+			self.trackPosition(xs[end-1], ys[end-1])
+			if self.interrupt:
+				break
+		self.trajectoryData = numpy.column_stack((xs, ys, self.baseVoltage - piezo, values))
+		return self.trajectoryData
+	
+	#scan a pattern of Trajectories.patterns (spiral, lissajous, line) with its parameters, from hooks e.g.
+	#scanPattern(line, 0.001, 0.002, 0.01, -15, 200) for a line cut at -15 degree
+	def scanPattern(self, name, *args):
+		from Trajectories import patterns
+		xs, ys = patterns[name.strip()](*[float(arg) for arg in args])
+		return self.scanTrajectory(xs, ys)
+	
+	#scan the points of a .npy or .csv file with the columns x, y and optionally focus
+	def scanPointFile(self, name):
+		name = name.strip()
+		points = numpy.load(name) if name.endswith(".npy") else numpy.loadtxt(name, delimiter=",", ndmin=2)
+		return self.scanTrajectory(points[:,0], points[:,1], points[:,2] if points.shape[1] > 2 else None)
+	
+	#average the last trajectory onto the grid xsteps x ysteps into dataArray (cells without a point are nan)
+	def gridTrajectory(self):
+		from Trajectories import gridPoints
+		data = self.trajectoryData
+		self.dataArray[...] = gridPoints(data[:,0], data[:,1], data[:,3], self.xsteps, self.ysteps)
+		return self.dataArray
+	
+	def saveTrajectory(self, name="tmpTrajectory"):
+		numpy.save(name.strip(), self.trajectoryData)
+	
+	#measure a list of single points, returns the rates
+	def scanPoints(self, xs, ys):
+		tmpBuffer = (c_int*19)()
+		updates = c_int()
+		values = numpy.zeros((len(xs),), dtype=numpy.float64)
+		for count in range(len(xs)):
+			self.setPosition(xs[count], ys[count])
+			self.settle(not self.adaptiveDwell)
+			values[count], dwell = self.acquirePixel(tmpBuffer, updates)
+			if self.interrupt:
+				break
+		return values
+	
+	#scan a batch of regions (see regionSpec, e.g. config files from a hook) back to back in the order with the
+	#least galvo/piezo travel, with one live view and without touching the loaded config.
+	#The results are stored by region name in self.regionData
+	def scanRegions(self, regions, master=None, refToMain=None):
+		self.interrupt = False
+		if not hasattr(self, "regionData"):
+			self.regionData = {}
+		focus = self.focus if hasattr(self, "focus") else None
+		order = orderRegions([self.regionSpec(region) for region in regions], (self.currentX, self.currentY, focus), self.focusTravelWeight)
+		saved = (self.xsteps, self.ysteps, self.dataArray)
+		view = None
+		for region in order:
+			if region["focus"] is not None and region["focus"] != focus:
+				self.setFocus(region["focus"])
+				focus = region["focus"]
+			print("scan region %s"%region["name"])
+			if "points" in region:
+				self.regionData[region["name"]] = self.scanPoints(region["points"][:,0], region["points"][:,1])
+			else:
+				self.xsteps = region["xsteps"]
+				self.ysteps = region["ysteps"]
+				self.dataArray = self.allocateArray((len(self.ysteps),len(self.xsteps)), "_"+region["name"])
+				if view is None:
+					view = self.createScanView(master, refToMain)
+				else:
+					view.setData(self.dataArray)
+				self.scanGrid(master)
+				self.regionData[region["name"]] = self.dataArray
+			if self.interrupt:
+				break
+		if view is not None:
+			view.stop()
+		self.xsteps, self.ysteps, self.dataArray = saved
+	
+	#save every region of the last scanRegions as <prefix><name>.npy
+	def saveRegions(self, prefix=""):
+		for name in self.regionData:
+			numpy.save(prefix.strip()+name, self.regionData[name])
+	
+	#save the next frame of the camera as png
 	def takePicture(self, name):
-		if not hasattr(self, "_context"):
+		if not self.camera.connected:
 			self.initCamera()
-		
-		fc2StartCapture(self._context)
-		#create the two pictures one for getting input the other to save
-		rawImage = fc2Image()
-		convertedImage = fc2Image()
-		fc2CreateImage(rawImage)
-		fc2CreateImage(convertedImage)
-		
-		fc2RetrieveBuffer(self._context, rawImage)
-		self.savePicture(name, rawImage, convertedImage)
-		
-		fc2DestroyImage(rawImage)
-		fc2DestroyImage(convertedImage)
-		fc2StopCapture(self._context)
-		
-	def savePicture(self, name, rawImage, convertedImage):
-		fc2ConvertImageTo(FC2_PIXEL_FORMAT_BGR, rawImage, convertedImage)
-		
-		fc2SaveImage(convertedImage, name.encode('utf-8'), 6)
-
-		
+		self.camera.startCapture()
+		self.camera.saveFrame(name)
+		self.camera.stopCapture()
+	
+	#the next frame of the camera as array (rows, cols), the capture keeps running for the following frames
+	def grabFrame(self):
+		if not self.camera.connected:
+			self.initCamera()
+		if not self.camera.capturing:
+			self.camera.startCapture()
+		return self.camera.retrieveFrame()
+	
 	def uninitCamera(self):
-		fc2StopCapture(self._context)
-		fc2DestroyContext(self._context)
+		if not self.deviceStarted("initCamera") or not self.camera.connected:
+			return
+		self.camera.disconnect()
 	
 	def initCamera(self):
-		error = fc2Error()
-		self._context = fc2Context()
-		self._guid = fc2PGRGuid()
-		self._numCameras = c_uint()
-		
-		error = fc2CreateContext(self._context)
-		if error != FC2_ERROR_OK.value:
-			print("Error in fc2CreateContext: " + str(error))
-		
-		error = fc2GetNumOfCameras(self._context, self._numCameras)
-		if error != FC2_ERROR_OK.value:
-			print("Error in fc2GetNumOfCameras: " + str(error))
-		if self._numCameras == 0:
-			print("No Cameras detected")
-		
-		#get the first camera
-		error = fc2GetCameraFromIndex(self._context, 0, self._guid)
-		if error != FC2_ERROR_OK.value:
-			print("Error in fc2GetCameraFromIndex: " + str(error))
-		
-		error = fc2Connect(self._context, self._guid)
-		if error!= FC2_ERROR_OK.value:
-			print("Error in fc2Connect: " + str(error))		
+		camera = self._devices.get("camera")
+		if camera is None:
+			camera = openCamera(self._deviceTypes["camera"])
+			camera.attach(self)
+		camera.connect()
+		if hasattr(self, "imageSettings"):
+			camera.setImageProperties(self.imageSettings['gain'], self.imageSettings['shutter'])
+		#ready once it delivers a frame with these settings
+		camera.startCapture()
+		camera.retrieveFrame()
+		camera.stopCapture()
+		self.camera = camera
 	def checkForMax(self, textBoxReference):
 		if not hasattr(self, "interrupt") or not self.interrupt or not hasattr(self, "noCheckForMax") or not self.noCheckForMax:
 			print("scan has not lunched yet, or is running")
 			self.startPoint = None
 			self.correctionFactor = (0,0)
 			return
-		TDC_freezeBuffers(True)
+		self.tdc.freezeBuffers(True)
 		#the scan is not running, so check if we are on the maximum in a 6x6 px array
 		#assume that currentXCoord and currentYCoord are set to the right spot
 		xfrom = max(self.currentXCoord-self.quadSize,0)
@@ -947,7 +2143,8 @@ class Scanner:
 			for y in numpy.linspace(0, yto-yfrom-1, yto-yfrom):
 				#get count rate
 				self.goTo(x+xfrom,y+yfrom, directly=True)
-				ret = TDC_getCoincCounters(tmpBuffer)
+				self.settle()
+				ret = self.tdc.getCoincCounters(tmpBuffer)
 				#set the count rate (the value we get is the pure count number, so divide by exposure time)
 				tmpData[y][x] = numpy.sum(tmpBuffer) / (self.exposureTime/1000)
 				tmpLocX += tmpData[y][x] * self.getGoToX(x+xfrom)
@@ -984,4 +2181,4 @@ class Scanner:
 		#clean up
 		tmpB = None
 		tmpBuffer = None	
-		TDC_freezeBuffers(False)	
\ No newline at end of file
+		self.tdc.freezeBuffers(False)	
\ No newline at end of file
@@ -0,0 +1,355 @@
+import time
+import numpy
+from ctypes import *
+
+#time to digital converters the scanner can count with. QutauTdc is the qutau behind qupsi (windows with
+#tdcbase.dll only), SimulatedTdc generates the photons of a synthetic sample, so scans run anywhere.
+#Both take the same ctypes buffers as the TDC_ functions of qupsi they are named after
+
+#constants of tdcbase.h (here, so they exist without the dll)
+TDC_INPUT_CHANNELS = 8
+TDC_COINC_CHANNELS = 19
+#order of the counters TDC_getCoincCounters returns: single channels, then the coincidences
+TDC_COINC_NAMES = ["1", "2", "3", "4", "5", "6", "7", "8", "1/2", "1/3", "2/3", "1/4", "2/4", "3/4", "1/2/3", "1/2/4", "1/3/4", "2/3/4", "1/2/3/4"]
+
+#"qutau", "simulated" or a tdc object
+def openTdc(tdc="qutau"):
+	if tdc == "qutau":
+		return QutauTdc()
+	if tdc == "simulated":
+		return SimulatedTdc()
+	return tdc
+
+class QutauTdc:
+	def __init__(self):
+		#binds the dll
+		import qupsi
+		self.lib = qupsi
+
+	#scanner the tdc counts for (the simulator needs its position)
+	def attach(self, scanner):
+		pass
+
+	def init(self, deviceId=-1):
+		return self.lib.TDC_init(deviceId)
+
+	def deInit(self):
+		return self.lib.TDC_deInit()
+
+	def getTimebase(self):
+		return self.lib.TDC_getTimebase()
+
+	def enableChannels(self, channelMask):
+		return self.lib.TDC_enableChannels(channelMask)
+
+	def setCoincidenceWindow(self, coincWin):
+		return self.lib.TDC_setCoincidenceWindow(coincWin)
+
+	def setExposureTime(self, expTime):
+		return self.lib.TDC_setExposureTime(expTime)
+
+	def getCoincCounters(self, data, updates=None):
+		return self.lib.TDC_getCoincCounters(data, updates)
+
+	def setTimestampBufferSize(self, size):
+		return self.lib.TDC_setTimestampBufferSize(size)
+
+	def freezeBuffers(self, freeze):
+		return self.lib.TDC_freezeBuffers(freeze)
+
+	def getLastTimestamps(self, reset, timestamps, channels, valid):
+		return self.lib.TDC_getLastTimestamps(reset, timestamps, channels, valid)
+
+	def enableStartStop(self, enable):
+		return self.lib.TDC_enableStartStop(enable)
+
+	def setHistogramParams(self, binWidth, binCount):
+		return self.lib.TDC_setHistogramParams(binWidth, binCount)
+
+	def getHistogram(self, chanA=-1, chanB=-1, reset=False, data=None, count=None, tooSmall=None, tooLarge=None, eventsA=None, eventsB=None, expTime=None):
+		return self.lib.TDC_getHistogram(chanA, chanB, reset, data, count, tooSmall, tooLarge, eventsA, eventsB, expTime)
+
+	def clearAllHistograms(self):
+		return self.lib.TDC_clearAllHistograms()
+
+	def enableHbt(self, enable):
+		return self.lib.TDC_enableHbt(enable)
+
+	def setHbtParams(self, binWidth, binCount):
+		return self.lib.TDC_setHbtParams(binWidth, binCount)
+
+	def resetHbtCorrelations(self):
+		return self.lib.TDC_resetHbtCorrelations()
+
+	def createHbtFunction(self):
+		return self.lib.TDC_createHbtFunction()
+
+	def calcHbtG2(self, fct):
+		return self.lib.TDC_calcHbtG2(fct)
+
+	def releaseHbtFunction(self, fct):
+		return self.lib.TDC_releaseHbtFunction(fct)
+
+#single photon emitters (positions in mm, brightness in counts/s in the center of the focus, lifetime in s)
+#on a background (counts/s), the focus is a gaussian spot with waist (mm)
+class EmitterMap:
+	def __init__(self, x, y, brightness, lifetime=1e-8, background=2000., waist=0.00025):
+		self.x = numpy.asarray(x, dtype=numpy.float64)
+		self.y = numpy.asarray(y, dtype=numpy.float64)
+		self.brightness = numpy.broadcast_to(numpy.asarray(brightness, dtype=numpy.float64), self.x.shape)
+		self.lifetime = numpy.broadcast_to(numpy.asarray(lifetime, dtype=numpy.float64), self.x.shape)
+		self.background = background
+		self.waist = waist
+
+	#emitters close enough to any of the positions to be seen
+	def near(self, xs, ys):
+		reach = 4*self.waist
+		return numpy.nonzero((self.x >= numpy.min(xs) - reach) & (self.x <= numpy.max(xs) + reach) & (self.y >= numpy.min(ys) - reach) & (self.y <= numpy.max(ys) + reach))[0]
+
+	#rate of every emitter (index) at the positions (..., len(index))
+	def signal(self, xs, ys, index):
+		dx = numpy.asarray(xs, dtype=numpy.float64)[..., None] - self.x[index]
+		dy = numpy.asarray(ys, dtype=numpy.float64)[..., None] - self.y[index]
+		return self.brightness[index] * numpy.exp(-2*(dx*dx + dy*dy) / self.waist**2)
+
+	#total rate and sum of the squared emitter rates at the positions, g2(0) is 1 - squares/rate**2
+	def rates(self, xs, ys):
+		xs = numpy.asarray(xs, dtype=numpy.float64)
+		ys = numpy.broadcast_to(numpy.asarray(ys, dtype=numpy.float64), xs.shape)
+		signal = self.signal(xs, ys, self.near(xs, ys))
+		return self.background + numpy.sum(signal, axis=-1), numpy.sum(signal*signal, axis=-1)
+
+#count emitters scattered over width x height (mm) around (x0, y0), the brightness varies log normally
+def randomEmitters(count=100, x0=0., y0=0., width=0.02, height=0.02, brightness=1e5, lifetime=1e-8, background=2000., waist=0.00025, seed=None):
+	rng = numpy.random.default_rng(seed)
+	return EmitterMap(x0 + width*(rng.random(count) - 0.5), y0 + height*(rng.random(count) - 0.5), brightness*rng.lognormal(0., 0.3, count), lifetime, background, waist)
+
+#hbt function of the simulator, fct[0][:] and fct[0].indexOffset like the TDC_HbtFunction of qupsi
+class HbtFunction:
+	def __init__(self, capacity):
+		self.capacity = capacity
+		self.size = 0
+		self.binWidth = 0
+		self.indexOffset = 0
+		self.values = numpy.zeros((capacity,), dtype=numpy.float64)
+
+	def __getitem__(self, key):
+		return self.values[:self.size][key]
+
+#photons of an EmitterMap seen through the focus at the position of the scanner (Scanner.samplePosition, or
+#position(times), times in the clock of the simulator, returning the x and y arrays in mm). Counters and histograms are poisson counts
+#of the expected rates of a frame, timestamps are generated photon by photon: every emitter is a two level
+#system (exponential excitation and decay), so the photons of one emitter are antibunched
+class SimulatedTdc:
+	def __init__(self, sample=None, position=None, seed=None):
+		self.sample = sample if sample is not None else randomEmitters(seed=seed)
+		self.position = position
+		self.scanner = None
+		self.rng = numpy.random.default_rng(seed)
+		self.clock = time.perf_counter
+		self.timebase = 81e-12
+		#the photons are split evenly between the detectors (channel indexes) of the hbt setup
+		self.detectors = (0, 1)
+		#fraction of the emitted photons which are detected
+		self.efficiency = 0.1
+		self.coincidenceWindow = 1e-8
+		#positions are sampled every positionStep seconds along the path of the focus
+		self.positionStep = 1e-5
+		self.expTime = 0.1
+		self.start = self.clock()
+		self.frame = 0
+		self.bufferSize = 1000000
+		self.frozen = False
+		self.lastTimestamp = self.start
+		self.timestamps = numpy.zeros((0,), dtype=numpy.int64)
+		self.channels = numpy.zeros((0,), dtype=numpy.uint8)
+		self.markers = []
+		self.hbtParams = (1000, 20)
+		self.hbtStart = self.start
+		self.histogramParams = (1000, 100)
+		self.histogramStart = self.start
+
+	def attach(self, scanner):
+		self.scanner = scanner
+
+	def positions(self, times):
+		if self.position is not None:
+			return self.position(times)
+		if self.scanner is not None:
+			return self.scanner.samplePosition(times)
+		return numpy.zeros(numpy.shape(times)), numpy.zeros(numpy.shape(times))
+
+	#mean rate of the interval and the depth of the antibunching dip (1 - g2(0)) of its photons
+	def meanRates(self, start, end):
+		times = numpy.linspace(start, end, max(int((end - start) / self.positionStep), 2))
+		rate, squares = self.sample.rates(*self.positions(times))
+		power = numpy.mean(rate*rate)
+		return numpy.mean(rate), numpy.mean(squares) / power if power > 0 else 0.
+
+	def init(self, deviceId=-1):
+		return 0
+
+	def deInit(self):
+		return 0
+
+	def getTimebase(self):
+		return self.timebase
+
+	def enableChannels(self, channelMask):
+		return 0
+
+	def setCoincidenceWindow(self, coincWin):
+		self.coincidenceWindow = coincWin * self.timebase
+		return 0
+
+	def setExposureTime(self, expTime):
+		self.expTime = expTime / 1000.
+		self.start = self.clock()
+		self.frame = 0
+		return 0
+
+	#counters of the last finished exposure frame, updates gets the number of frames since the last call
+	def getCoincCounters(self, data, updates=None):
+		frame = int((self.clock() - self.start) / self.expTime)
+		if updates is not None:
+			updates.value = frame - self.frame
+		self.frame = frame
+		counts = numpy.zeros((TDC_COINC_CHANNELS,), dtype=numpy.int64)
+		if frame > 0:
+			end = self.start + frame*self.expTime
+			rate, dip = self.meanRates(end - self.expTime, end)
+			share = rate / len(self.detectors)
+			counts[list(self.detectors)] = self.rng.poisson(share*self.expTime, len(self.detectors))
+			#coincidences of the first two detectors, fewer than by chance because of the antibunching
+			counts[TDC_INPUT_CHANNELS] = self.rng.poisson(share*share*self.coincidenceWindow*self.expTime*self.g2(0., dip))
+		data[:] = counts.tolist()
+		return 0
+
+	def setTimestampBufferSize(self, size):
+		self.bufferSize = size
+		return 0
+
+	def freezeBuffers(self, freeze):
+		if not freeze:
+			#nothing was recorded while frozen
+			self.lastTimestamp = self.clock()
+		self.frozen = freeze
+		return 0
+
+	#add an event on channel at time (clock of the simulator, now if None), e.g. the line trigger of the card
+	def trigger(self, channel, at=None):
+		self.markers.append((self.clock() if at is None else at, channel))
+
+	#photons between start and end as (times, channels)
+	def photons(self, start, end):
+		sample = self.sample
+		times = numpy.linspace(start, end, max(int((end - start) / self.positionStep), 2))
+		xs, ys = self.positions(times)
+		allTimes = [start + (end - start)*self.rng.random(self.rng.poisson(sample.background*(end - start)))]
+		for emitter in sample.near(xs, ys):
+			#emissions of the emitter driven into saturation, thinned by the intensity at the focus
+			emitted = sample.brightness[emitter] / self.efficiency
+			excitation = max(1./emitted - sample.lifetime[emitter], 1e-12)
+			count = int(emitted*(end - start)*1.2) + 10
+			emissions = start + numpy.cumsum(self.rng.exponential(excitation, count) + self.rng.exponential(sample.lifetime[emitter], count))
+			emissions = emissions[emissions < end]
+			intensity = sample.signal(numpy.interp(emissions, times, xs), numpy.interp(emissions, times, ys), [emitter])[:, 0] / sample.brightness[emitter]
+			allTimes.append(emissions[self.rng.random(len(emissions)) < intensity*self.efficiency])
+		photonTimes = numpy.concatenate(allTimes)
+		return photonTimes, numpy.asarray(self.detectors, dtype=numpy.uint8)[self.rng.integers(0, len(self.detectors), len(photonTimes))]
+
+	def getLastTimestamps(self, reset, timestamps, channels, valid):
+		now = self.clock()
+		if not self.frozen:
+			#at most the last second, the buffer of the device only holds the latest timestamps anyway
+			start = max(self.lastTimestamp, now - 1.0)
+			photonTimes, photonChannels = self.photons(start, now)
+			markers = [(at, channel) for at, channel in self.markers if at < now]
+			self.markers = [(at, channel) for at, channel in self.markers if at >= now]
+			allTimes = numpy.concatenate([photonTimes, [at for at, channel in markers]])
+			allChannels = numpy.concatenate([photonChannels, numpy.array([channel for at, channel in markers], dtype=numpy.uint8)])
+			order = numpy.argsort(allTimes, kind="stable")
+			self.timestamps = numpy.concatenate([self.timestamps, ((allTimes[order] - self.start) / self.timebase).astype(numpy.int64)])[-self.bufferSize:]
+			self.channels = numpy.concatenate([self.channels, allChannels[order]])[-self.bufferSize:]
+			self.lastTimestamp = now
+		n = min(len(self.timestamps), len(timestamps))
+		numpy.ctypeslib.as_array(timestamps)[:n] = self.timestamps[-n:] if n > 0 else []
+		numpy.ctypeslib.as_array(channels)[:n] = self.channels[-n:] if n > 0 else []
+		valid.value = n
+		if reset:
+			self.timestamps = self.timestamps[:0]
+			self.channels = self.channels[:0]
+		return 0
+
+	def enableStartStop(self, enable):
+		return 0
+
+	def setHistogramParams(self, binWidth, binCount):
+		self.histogramParams = (binWidth, binCount)
+		return 0
+
+	#start stop histogram: a start on chanA and the next stop on chanB, short delays are missing because of the
+	#antibunching
+	def getHistogram(self, chanA=-1, chanB=-1, reset=False, data=None, count=None, tooSmall=None, tooLarge=None, eventsA=None, eventsB=None, expTime=None):
+		now = self.clock()
+		binWidth, binCount = self.histogramParams
+		duration = now - self.histogramStart
+		rate, dip = self.meanRates(max(self.histogramStart, now - 1.0), now)
+		share = rate / len(self.detectors)
+		tau = numpy.arange(binCount) * binWidth * self.timebase
+		expected = share*share*binWidth*self.timebase*duration * self.g2(tau, dip) * numpy.exp(-share*tau)
+		histogram = self.rng.poisson(expected)
+		if data is not None:
+			data[:binCount] = histogram.tolist()
+		for value, result in ((count, numpy.sum(histogram)), (tooSmall, 0), (tooLarge, 0), (eventsA, share*duration), (eventsB, share*duration), (expTime, duration*1000.)):
+			if value is not None:
+				value.value = int(result)
+		if reset:
+			self.histogramStart = now
+		return 0
+
+	def clearAllHistograms(self):
+		self.histogramStart = self.clock()
+		return 0
+
+	#g2 of the photons at delays tau with the antibunching dip (see meanRates), the emitters at the spot all have
+	#about the same lifetime
+	def g2(self, tau, dip):
+		lifetime = numpy.mean(self.sample.lifetime) if len(self.sample.lifetime) > 0 else 1e-8
+		return 1. - dip * numpy.exp(-numpy.abs(tau) / lifetime)
+
+	def enableHbt(self, enable):
+		return 0
+
+	def setHbtParams(self, binWidth, binCount):
+		self.hbtParams = (binWidth, binCount)
+		return 0
+
+	def resetHbtCorrelations(self):
+		self.hbtStart = self.clock()
+		return 0
+
+	def createHbtFunction(self):
+		return [HbtFunction(2*self.hbtParams[1] - 1)]
+
+	#normalised g2 of the coincidences since the last reset, with their poisson noise
+	def calcHbtG2(self, fct):
+		function = fct[0]
+		now = self.clock()
+		binWidth, binCount = self.hbtParams
+		duration = now - self.hbtStart
+		rate, dip = self.meanRates(max(self.hbtStart, now - 1.0), now)
+		share = rate / len(self.detectors)
+		tau = numpy.arange(-(binCount - 1), binCount) * binWidth * self.timebase
+		expected = share*share*binWidth*self.timebase*duration
+		g2 = self.g2(tau, dip)
+		if expected > 0:
+			g2 = self.rng.poisson(expected*g2) / expected
+		function.size = min(len(g2), function.capacity)
+		function.binWidth = binWidth
+		function.indexOffset = binCount - 1
+		function.values[:function.size] = g2[:function.size]
+		return 0
+
+	def releaseHbtFunction(self, fct):
+		pass
@@ -0,0 +1,45 @@
+import numpy
+
+#parametric scan patterns, every pattern returns the sample positions (xs, ys) in mm in the order they are
+#visited (see Scanner.scanTrajectory and Scanner.scanPattern)
+
+#archimedean spiral from (x0, y0) outwards, the points are spaced evenly along the path
+def spiral(x0, y0, radius, turns, points):
+	#the length of the path grows with the square of the angle
+	t = numpy.sqrt(numpy.linspace(0, 1, int(points)))
+	angle = 2*numpy.pi*turns*t
+	return x0 + radius*t*numpy.cos(angle), y0 + radius*t*numpy.sin(angle)
+
+#lissajous figure with frequencies a (x) and b (y) in the width x height box around (x0, y0), phase in degree
+def lissajous(x0, y0, width, height, a, b, points, phase=90):
+	t = numpy.linspace(0, 2*numpy.pi, int(points), endpoint=False)
+	return x0 + width/2.*numpy.sin(a*t + numpy.radians(phase)), y0 + height/2.*numpy.sin(b*t)
+
+#straight line of length centered on (x0, y0) at angle (degree) against the x axis
+def line(x0, y0, length, angle, points):
+	distance = numpy.linspace(-length/2., length/2., int(points))
+	return x0 + distance*numpy.cos(numpy.radians(angle)), y0 + distance*numpy.sin(numpy.radians(angle))
+
+patterns = {"spiral" : spiral, "lissajous" : lissajous, "line" : line}
+
+#index of the nearest step of a regular grid (numpy.linspace), -1 for values more than half a step outside
+def gridIndex(steps, values):
+	steps = numpy.asarray(steps, dtype=numpy.float64)
+	if len(steps) < 2:
+		return numpy.zeros(numpy.shape(values), dtype=numpy.intp)
+	index = numpy.rint((numpy.asarray(values) - steps[0]) / (steps[1] - steps[0])).astype(numpy.intp)
+	index[(index < 0) | (index >= len(steps))] = -1
+	return index
+
+#average the values of the points onto the grid xsteps x ysteps (y, x), cells without a point are nan
+def gridPoints(xs, ys, values, xsteps, ysteps):
+	ix = gridIndex(xsteps, xs)
+	iy = gridIndex(ysteps, ys)
+	inside = (ix >= 0) & (iy >= 0)
+	cells = iy[inside]*len(xsteps) + ix[inside]
+	size = len(xsteps)*len(ysteps)
+	sums = numpy.bincount(cells, weights=numpy.asarray(values, dtype=numpy.float64)[inside], minlength=size)
+	counts = numpy.bincount(cells, minlength=size)
+	grid = numpy.full((size,), numpy.nan)
+	grid[counts > 0] = sums[counts > 0] / counts[counts > 0]
+	return grid.reshape((len(ysteps), len(xsteps)))
@@ -6,9 +6,8 @@ from Enum import *
 tdcbase = windll.tdcbase
 #tdcbase.h
 
-#constants
-TDC_INPUT_CHANNELS = 8
-TDC_COINC_CHANNELS = 19
+#constants (TDC_INPUT_CHANNELS, TDC_COINC_CHANNELS, TDC_COINC_NAMES) live in Tdc.py, they are needed without the dll
+from Tdc import TDC_INPUT_CHANNELS, TDC_COINC_CHANNELS, TDC_COINC_NAMES
 
 #enums
 TDC_DevType = Enum("DEVTYPE_1A", "DEVTYPE_1B", "DEVTYPE_1C", "DEVTYPE_NONE")
@@ -113,9 +112,9 @@ def TDC_getDataLost(lost):
 	return tdcbase.TDC_getDataLost(byref(lost))
 
 tdcbase.TDC_setTimestampBufferSize.argtypes = [c_int]
-tdcbase.TDC_setTimestampBufferSize.reset = c_int
+tdcbase.TDC_setTimestampBufferSize.restype = c_int
 def TDC_setTimestampBufferSize(size):
-	return TDC_setTimestampBufferSize(size)
+	return tdcbase.TDC_setTimestampBufferSize(size)
 	
 tdcbase.TDC_freezeBuffers.argtypes = [c_bool]
 tdcbase.TDC_freezeBuffers.restype = c_int
@@ -127,10 +126,11 @@ tdcbase.TDC_getCoincCounters.restype = c_int
 def TDC_getCoincCounters(data, updates=None):
 	return tdcbase.TDC_getCoincCounters(data, (updates) if updates is not None else None)
 
-tdcbase.TDC_getLastTimestamps.argtypes = [c_bool, POINTER(c_long), POINTER(c_short),POINTER(c_int)]
+#timestamps is a c_longlong array, channels a c_ubyte array (Int64 and Uint8 in tdcbase.h)
+tdcbase.TDC_getLastTimestamps.argtypes = [c_bool, POINTER(c_longlong), POINTER(c_ubyte),POINTER(c_int)]
 tdcbase.TDC_getLastTimestamps.restype = c_int
 def TDC_getLastTimestamps(reset, timestamps, channels, valid):
-	return tdcbase.TDC_getLastTimestamps(reset, byref(timestamps), byref(channels), byref(valid))
+	return tdcbase.TDC_getLastTimestamps(reset, timestamps, channels, byref(valid))
 
 tdcbase.TDC_writeTimestamps.argtypes = [c_char_p, c_int]
 tdcbase.TDC_writeTimestamps.restype = c_int
@@ -0,0 +1,90 @@
+import argparse
+import sys
+import time
+
+#headless entry point for batch runs, no gui module is imported and nothing is drawn while scanning
+#usage: python -m scanrun run <hook> [--profile timing_profile.json] [--config scanner_config.cfg] [--camera]
+#                                 [--tdc qutau|simulated] [--daq nidaq|simulated] [--cameraDevice flycapture|simulated]
+#       python -m scanrun scan <config> <output> [--profile ...] [--config scanner_config.cfg] [--camera] [--tdc ...] [--daq ...] [--cameraDevice ...]
+#       python -m scanrun plan <config or hook> [--profile timing_profile.json] [--config scanner_config.cfg]
+#(not "scanner", that would be Scanner.py itself on windows)
+
+def openScanner(args):
+	import Scanner
+	start = time.time()
+	scanner = Scanner.Scanner(configFile=args.config, camera=args.camera, headless=True, tdc=args.tdc, daq=args.daq, cameraDevice=args.cameraDevice)
+	if args.profile is not None:
+		scanner.timingProfile = args.profile
+	print("config read after %.2f s, the devices connect in the background"%(time.time() - start))
+	return scanner
+
+def release(scanner):
+	for init, seconds in sorted(scanner.initTiming.items()):
+		print("%s took %.2f s"%(init, seconds))
+	scanner.ReleaseObjects()
+
+def run(args):
+	scanner = openScanner(args)
+	try:
+		start = time.time()
+		scanner.startScanhook(scanner.parseHook(args.hook))
+		print("%s done after %.1f s"%(args.hook, time.time() - start))
+	finally:
+		release(scanner)
+
+def scan(args):
+	scanner = openScanner(args)
+	try:
+		start = time.time()
+		scanner.loadConfig(args.scanConfig)
+		scanner.scanSample()
+		scanner.saveState(args.output)
+		print("%s done after %.1f s"%(args.output, time.time() - start))
+	finally:
+		release(scanner)
+
+def plan(args):
+	import ScanPlanner
+	profile = ScanPlanner.readProfile(args.profile)
+	settings = dict(ScanPlanner.defaults)
+	settings.update(ScanPlanner.readSettings(args.config))
+	#the scans of scanrun draw nothing
+	settings["headless"] = True
+	if args.file.endswith(".hk"):
+		steps, total = ScanPlanner.planHook(args.file, settings, profile)
+	else:
+		settings.update(ScanPlanner.readSettings(args.file))
+		total = ScanPlanner.planScan("scanSample", settings, profile)
+		steps = [("scanSample", total)]
+	ScanPlanner.report(steps, total)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="scanrun", description="headless scans without gui")
+	parser.add_argument("--config", default="scanner_config.cfg", help="config of the scanner")
+	parser.add_argument("--camera", action="store_true", help="connect the camera at start (takePicture does it on demand otherwise)")
+	parser.add_argument("--tdc", default="qutau", choices=("qutau", "simulated"), help="count with the qutau or with the photon simulator (Tdc.py)")
+	parser.add_argument("--daq", default="nidaq", choices=("nidaq", "simulated"), help="write the voltages with the ni card or with the galvo simulator (Daq.py)")
+	parser.add_argument("--cameraDevice", default="flycapture", choices=("flycapture", "simulated"), help="take pictures with the point grey camera or with the simulated one (Camera.py)")
+	commands = parser.add_subparsers(dest="command")
+	command = commands.add_parser("run", help="run a hook file")
+	command.add_argument("hook")
+	command.add_argument("--profile", default=None, help="merge the measured overheads into this timing profile (for plan)")
+	command.set_defaults(function=run)
+	command = commands.add_parser("scan", help="scan with a config and save the map (.npy/.csv)")
+	command.add_argument("scanConfig")
+	command.add_argument("output")
+	command.add_argument("--profile", default=None, help="merge the measured overheads into this timing profile (for plan)")
+	command.set_defaults(function=scan)
+	command = commands.add_parser("plan", help="estimate duration, memory and disk of a config or hook")
+	command.add_argument("file")
+	command.add_argument("--profile", default="timing_profile.json")
+	command.set_defaults(function=plan)
+	args = parser.parse_args(argv)
+	if args.command is None:
+		parser.print_help()
+		return 1
+	args.function(args)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())